@@ -14,35 +14,62 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
-from fedora_messaging import message
+import importlib
+import sys
 
-import pkg_resources
 
-from .messages import (  # noqa: F401
-    CalendarClearV1,
-    CalendarDeleteV1,
-    CalendarNewV1,
-    CalendarUpdateV1,
-    CalendarUploadV1,
-    MeetingDeleteV1,
-    MeetingNewV1,
-    MeetingUpdateV1,
-    ReminderV1,
-)
+# The public names, and the module and attribute they come from. They are only
+# imported when first used, so that importing the package stays cheap.
+_LAZY_ATTRIBUTES = {
+    "CalendarClearV1": (".messages", "CalendarClearV1"),
+    "CalendarDeleteV1": (".messages", "CalendarDeleteV1"),
+    "CalendarNewV1": (".messages", "CalendarNewV1"),
+    "CalendarUpdateV1": (".messages", "CalendarUpdateV1"),
+    "CalendarUploadV1": (".messages", "CalendarUploadV1"),
+    "MeetingDeleteV1": (".messages", "MeetingDeleteV1"),
+    "MeetingNewV1": (".messages", "MeetingNewV1"),
+    "MeetingUpdateV1": (".messages", "MeetingUpdateV1"),
+    "ReminderV1": (".messages", "ReminderV1"),
+    "find_class": (".registry", "find_class"),
+    "get_registry": (".registry", "get_registry"),
+    "match_topics": (".registry", "match_topics"),
+    "refresh_registry": (".registry", "refresh_registry"),
+    "validate_many": (".validation", "validate_many"),
+    "validation_cache": (".validation", "cache"),
+}
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(module_name, __name__), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+if sys.version_info < (3, 7):  # pragma: no cover
+    # Module __getattr__ is not supported, import everything right away.
+    for _name in _LAZY_ATTRIBUTES:
+        __getattr__(_name)
 
 
 def get_message_object_from_topic(topic):
     """Returns the Message class corresponding to the topic."""
+    from fedora_messaging import message
+
+    from .registry import get_registry
 
-    output = None
+    return get_registry().get(topic, message.Message)
 
-    for entry_point in pkg_resources.iter_entry_points("fedora.messages"):
-        cls = entry_point.load()
-        if cls().topic == topic:
-            output = cls
-            break
 
-    if output is None:
-        output = message.Message
+def get_message_objects_from_topics(topics):
+    """Returns the fedocal Message classes matching the topics or topic patterns."""
+    from .registry import match_topics
 
-    return output
+    return match_topics(topics)
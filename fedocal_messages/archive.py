@@ -0,0 +1,208 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Streaming reader for archives of fedocal messages.
+
+Archives are in the format written by :func:`fedora_messaging.message.dumps`:
+one JSON object per line, with the ``topic``, ``headers``, ``id``, ``body`` and
+``queue`` of a message.
+"""
+
+import json
+import mmap
+import re
+
+from fedora_messaging.exceptions import ValidationError
+
+import pika
+
+from . import timeutils
+from .base import FedocalMessage
+from .registry import find_class, get_registry, match_topics
+
+
+_TOPIC = re.compile(rb'"topic":\s*"([^"\\]*)"')
+_SENT_AT = re.compile(rb'"sent-at":\s*"([^"\\]*)"')
+
+
+def _peek(line, key, pattern):
+    """
+    Return the string value of a key found in a line without decoding it.
+
+    The value is only trusted when the key appears once in the line, so that it
+    cannot have been found in the body instead. Otherwise ``None`` is returned.
+    """
+    if line.count(key) != 1:
+        return None
+    match = pattern.search(line)
+    if match is None:
+        return None
+    return match.group(1).decode("utf-8")
+
+
+def _needles(calendars):
+    """Return the byte strings a line must contain to be about one of the calendars."""
+    needles = set()
+    for name in calendars:
+        for ensure_ascii in (True, False):
+            needles.add(json.dumps(name, ensure_ascii=ensure_ascii).encode("utf-8"))
+    return tuple(needles)
+
+
+def _lines(path):
+    """Yield the line number and the content of each non-empty line of a file."""
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            return
+        with data:
+            start = 0
+            number = 0
+            size = len(data)
+            while start < size:
+                end = data.find(b"\n", start)
+                if end == -1:
+                    end = size
+                number += 1
+                line = data[start:end].strip()
+                start = end + 1
+                if line:
+                    yield number, line
+
+
+def message_from_record(record, cls):
+    """
+    Build a message from a record of an archive, keeping its headers and id.
+
+    Args:
+        record (dict): The ``topic``, ``headers``, ``id``, ``body`` and ``queue`` of
+            the message.
+        cls (type): The message class.
+
+    Returns:
+        fedora_messaging.message.Message: The message.
+    """
+    headers = record["headers"]
+    properties = pika.BasicProperties(
+        content_type="application/json",
+        content_encoding="utf-8",
+        delivery_mode=2,
+        headers=headers,
+        message_id=record.get("id"),
+    )
+    msg = cls(
+        body=record["body"],
+        topic=record["topic"],
+        properties=properties,
+        severity=headers.get("fedora_messaging_severity"),
+    )
+    msg.queue = record.get("queue")
+    return msg
+
+
+def read_archive(path, topics=None, calendars=None, since=None, until=None):
+    """
+    Read the fedocal messages of an archive, one at a time.
+
+    The file is memory-mapped and only the lines passing the filters are decoded:
+    the topic and the ``sent-at`` header are looked up in the raw line, and lines
+    that cannot be about the requested calendars are skipped. Lines that are not
+    fedocal messages are skipped too. Skipped lines are not decoded, so they are
+    not checked either. Topics may carry an environment prefix, like the ones of
+    messages consumed from the broker.
+
+    Args:
+        path (str): The path of the archive.
+        topics (iterable): Topics or AMQP-style topic patterns to keep. Defaults to
+            every fedocal topic.
+        calendars (iterable): The names of the calendars to keep. Defaults to every
+            calendar.
+        since (datetime.datetime): Skip the messages sent before this time. Naive
+            datetimes are in UTC.
+        until (datetime.datetime): Skip the messages sent at or after this time.
+            Naive datetimes are in UTC.
+
+    Yields:
+        FedocalMessage: The messages, in the order of the archive.
+
+    Raises:
+        fedora_messaging.exceptions.ValidationError: If a line that is decoded is
+            not a valid serialized message.
+    """
+    if topics is None:
+        wanted = {
+            cls for cls in get_registry().values() if issubclass(cls, FedocalMessage)
+        }
+    else:
+        wanted = set(match_topics(topics))
+    calendars = frozenset(calendars) if calendars is not None else None
+    needles = _needles(calendars) if calendars is not None else ()
+    since = timeutils.to_naive_utc(since) if since is not None else None
+    until = timeutils.to_naive_utc(until) if until is not None else None
+    timed = since is not None or until is not None
+
+    classes = {}
+
+    def resolve(topic):
+        try:
+            return classes[topic]
+        except KeyError:
+            cls = find_class(topic)
+            cls = classes[topic] = cls if cls in wanted else None
+            return cls
+
+    def in_range(sent_at):
+        if sent_at is None:
+            return False
+        if since is not None and sent_at < since:
+            return False
+        return until is None or sent_at < until
+
+    for number, line in _lines(path):
+        topic = _peek(line, b'"topic"', _TOPIC)
+        if topic is not None and resolve(topic) is None:
+            continue
+        if needles and not any(needle in line for needle in needles):
+            continue
+        if timed:
+            sent_at = _peek(line, b'"sent-at"', _SENT_AT)
+            if sent_at is not None and not in_range(timeutils.parse_sent_at(sent_at)):
+                continue
+
+        try:
+            data = json.loads(line.decode("utf-8"))
+            topic = data["topic"]
+            body = data["body"]
+            sent_at = data["headers"].get("sent-at")
+            cls = resolve(topic)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ValidationError("line {}: {}".format(number, e))
+        if cls is None:
+            continue
+        if calendars is not None:
+            try:
+                calendar = body["calendar"]["calendar_name"]
+            except (KeyError, TypeError):
+                continue
+            if calendar not in calendars:
+                continue
+        if timed and not in_range(timeutils.parse_sent_at(sent_at)):
+            continue
+
+        yield message_from_record(data, cls)
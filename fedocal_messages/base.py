@@ -14,9 +14,15 @@
 # with this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import functools
+import json
+
 from fedora_messaging import message
+from fedora_messaging.exceptions import ValidationError
 from fedora_messaging.schema_utils import user_avatar_url
 
+from . import timeutils, validation
+
 
 SCHEMA_URL = "http://fedoraproject.org/message-schema/"
 
@@ -71,12 +77,209 @@ CALENDAR = {
 }
 
 
+class Calendar:
+    """
+    A view of a calendar, with one attribute per field of the ``CALENDAR`` schema.
+
+    Fields missing from the data are set to ``None``.
+    """
+
+    __slots__ = tuple(CALENDAR["properties"])
+
+    def __init__(self, data):
+        for name in CALENDAR["properties"]:
+            setattr(self, name, data.get(name))
+
+    def __repr__(self):
+        return "Calendar(calendar_name={!r})".format(self.calendar_name)
+
+
+class Meeting:
+    """
+    A view of a meeting, with one attribute per field of the ``MEETING`` schema.
+
+    Fields missing from the data are set to ``None``. The start and end of the
+    meeting are parsed when first accessed and then kept.
+
+    fedocal publishes the dates and times of meetings in UTC, ``meeting_timezone``
+    is the timezone the meeting was created in and is meant for display.
+    """
+
+    __slots__ = tuple(MEETING["properties"]) + ("_start", "_end")
+
+    def __init__(self, data):
+        for name in MEETING["properties"]:
+            setattr(self, name, data.get(name))
+        self._start = None
+        self._end = None
+
+    def __repr__(self):
+        return "Meeting(meeting_id={!r}, meeting_name={!r})".format(
+            self.meeting_id, self.meeting_name
+        )
+
+    @property
+    def start(self):
+        """datetime.datetime: When the meeting starts, as a naive UTC datetime."""
+        if self._start is None:
+            self._start = timeutils.parse_meeting_datetime(
+                self.meeting_date, self.meeting_time_start
+            )
+        return self._start
+
+    @property
+    def end(self):
+        """datetime.datetime: When the meeting ends, as a naive UTC datetime."""
+        if self._end is None:
+            self._end = timeutils.parse_meeting_datetime(
+                self.meeting_date_end, self.meeting_time_stop
+            )
+        return self._end
+
+    @property
+    def timezone(self):
+        """datetime.tzinfo: The timezone of the meeting, UTC if unknown."""
+        return timeutils.get_timezone(self.meeting_timezone)
+
+    @property
+    def start_local(self):
+        """datetime.datetime: When the meeting starts, in the meeting timezone."""
+        return timeutils.to_timezone(self.start, self.meeting_timezone)
+
+    @property
+    def end_local(self):
+        """datetime.datetime: When the meeting ends, in the meeting timezone."""
+        return timeutils.to_timezone(self.end, self.meeting_timezone)
+
+
+@functools.lru_cache(maxsize=1024)
+def avatar_url(agent):
+    """
+    Return the avatar URL of a user.
+
+    The URLs of the most active users are kept, use ``avatar_url.cache_info()``
+    to see how well that works.
+    """
+    return user_avatar_url(agent)
+
+
+def memoized(func):
+    """
+    Cache the value a message method returns until the message body is replaced.
+
+    Changes made to the body in place are not noticed.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(self):
+        try:
+            return self._memo[name]
+        except KeyError:
+            value = self._memo[name] = func(self)
+            return value
+
+    return wrapper
+
+
 class FedocalMessage(message.Message):
     """
     A sub-class of a Fedora message that defines a message schema for messages
     published by fedocal.
+
+    Attributes:
+        fast_validation (bool): Whether to check the body with a checker generated
+            from the body schema before falling back to jsonschema. Defaults to
+            ``False``.
     """
 
+    fast_validation = False
+
+    # The encoded body and its encoding, until the body is first accessed.
+    _raw_body = None
+
+    @classmethod
+    def from_raw(cls, payload, properties, topic=None, severity=None, encoding="utf-8"):
+        """
+        Build a message from its encoded body, which is only decoded when first used.
+
+        This lets consumers look at the topic or the headers and discard a message
+        without paying for decoding its body.
+
+        Args:
+            payload (bytes): The JSON-encoded message body.
+            properties (pika.BasicProperties): The AMQP properties, as received. They
+                are required because the filtering headers are built from the body.
+            topic (str): The message topic. Defaults to the class topic.
+            severity (int): The message severity.
+            encoding (str): The encoding of the payload.
+
+        Returns:
+            FedocalMessage: The message.
+        """
+        msg = cls(topic=topic, properties=properties, severity=severity)
+        msg._raw_body = (payload, encoding)
+        msg._memo = {}
+        return msg
+
+    @property
+    def body(self):
+        """
+        The message body as a Python dictionary.
+
+        Raises:
+            fedora_messaging.exceptions.ValidationError: If the message was built with
+                :meth:`from_raw` and its payload cannot be decoded.
+        """
+        if self._raw_body is not None:
+            payload, encoding = self._raw_body
+            try:
+                self._decoded_body = json.loads(payload.decode(encoding))
+            except ValueError as e:
+                raise ValidationError(e)
+            self._raw_body = None
+        return self._decoded_body
+
+    @body.setter
+    def body(self, value):
+        self._decoded_body = value
+        self._raw_body = None
+        self._memo = {}
+
+    @property
+    def _encoded_body(self):
+        """The encoded body, reusing the payload the message was built from."""
+        if self._raw_body is not None and self._raw_body[1] == "utf-8":
+            return self._raw_body[0]
+        return super()._encoded_body
+
+    def validate(self):
+        """
+        Validate the headers and body with the message schema.
+
+        This checks the same schemas as :meth:`fedora_messaging.message.Message.validate`,
+        but each schema is compiled into a validator once and then reused. When
+        :data:`fedocal_messages.validation.cache` is enabled, bodies found valid are
+        remembered there and are not checked again.
+
+        Raises:
+            jsonschema.ValidationError: If either the message headers or the message body
+                are invalid.
+            jsonschema.SchemaError: If either the message header schema or the message body
+                schema are invalid.
+            fedora_messaging.exceptions.ValidationError: If the message was built with
+                :meth:`from_raw` and its payload cannot be decoded.
+        """
+        for schema in (self.headers_schema, message.Message.headers_schema):
+            validation.validate(self._headers, schema)
+        key = validation.cache.key(type(self), self.body)
+        if key is not None and key in validation.cache:
+            return
+        for schema in (self.body_schema, message.Message.body_schema):
+            validation.validate(self.body, schema, fast=self.fast_validation)
+        if key is not None:
+            validation.cache.add(key)
+
     @property
     def app_name(self):
         return "fedocal"
@@ -90,10 +293,12 @@ class FedocalMessage(message.Message):
         return self.body.get("agent")
 
     @property
+    @memoized
     def agent_avatar(self):
-        return user_avatar_url(self.agent)
+        return avatar_url(self.agent)
 
     @property
+    @memoized
     def usernames(self):
         if self.agent:
             return [self.agent]
@@ -101,8 +306,24 @@ class FedocalMessage(message.Message):
             return []
 
     @property
+    @memoized
     def url(self):
         try:
             return self.body["thing"]["url"]
         except KeyError:
             return None
+
+    @property
+    @memoized
+    def calendar(self):
+        """Calendar: The calendar the message is about."""
+        return Calendar(self.body.get("calendar") or {})
+
+    @property
+    @memoized
+    def meeting(self):
+        """Meeting: The meeting the message is about, or ``None``."""
+        data = self.body.get("meeting")
+        if data is None:
+            return None
+        return Meeting(data)
@@ -0,0 +1,472 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Micro-benchmarks for the fedocal message schemas.
+
+Run them with ``python -m fedocal_messages.bench``. The results can be written
+to a JSON file with ``--output`` and compared to the results of a previous run
+with ``--compare``, which fails if an operation got slower than its threshold.
+"""
+
+import argparse
+import collections
+import datetime
+import fnmatch
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+
+import dateutil.tz
+
+from fedora_messaging import message
+
+from . import get_message_object_from_topic, timeutils, validation
+from .base import Meeting
+from .coalesce import coalesce
+from .messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    CalendarUpdateV1,
+    CalendarUploadV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+    _casual_timedelta_string,
+    casual_timedelta_strings,
+)
+from .scheduler import ReminderScheduler
+from .synthetic import TrafficGenerator
+from .validation import validate_many
+
+
+SAMPLE_CALENDAR = {
+    "calendar_name": "infrastructure",
+    "calendar_contact": "infrastructure@lists.fedoraproject.org",
+    "calendar_description": "Fedora Infrastructure meetings",
+    "calendar_editor_group": None,
+    "calendar_admin_group": "sysadmin-main",
+    "calendar_status": "Enabled",
+}
+
+SAMPLE_MEETING = {
+    "meeting_id": 42,
+    "meeting_name": "Infrastructure weekly meeting",
+    "meeting_manager": ["nirik", "pingou"],
+    "meeting_date": "2020-03-05",
+    "meeting_date_end": "2020-03-05",
+    "meeting_time_start": "16:00:00",
+    "meeting_time_stop": "17:00:00",
+    "meeting_timezone": "UTC",
+    "meeting_information": "Weekly sync of the infrastructure team",
+    "meeting_location": "fedora-meeting-1@irc.freenode.net",
+    "calendar_name": "infrastructure",
+}
+
+SAMPLE_BODY = {
+    "agent": "pingou",
+    "calendar": SAMPLE_CALENDAR,
+    "meeting": SAMPLE_MEETING,
+}
+
+
+MESSAGE_CLASSES = [
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    CalendarUpdateV1,
+    CalendarUploadV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+]
+
+# Variants that are ratios between other variants rather than timings.
+RATIOS = ("speedup", "overhead")
+
+
+def _best(func, number, repeat=3):
+    """Return the best time, in seconds, of a single call to ``func``."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def _best_each(factory, func, number, repeat=3):
+    """
+    Return the best time, in seconds, of calling ``func`` on one object.
+
+    Each call gets a fresh object from ``factory``, so that nothing memoized on
+    the objects is reused.
+    """
+    times = []
+    for _ in range(repeat):
+        objects = [factory() for _ in range(number)]
+        times.append(timeit.timeit(lambda: [func(obj) for obj in objects], number=1))
+    return min(times) / number
+
+
+def sample_body(cls):
+    """Return a valid sample body for a message class."""
+    required = cls.body_schema["required"]
+    return {key: value for key, value in SAMPLE_BODY.items() if key in required}
+
+
+def bench_messages(number=1000):
+    """Time the main operations of each message class."""
+    results = {}
+    enabled = validation.cache.enabled
+    validation.cache.enabled = False
+    try:
+        for cls in MESSAGE_CLASSES:
+            body = sample_body(cls)
+
+            def factory():
+                return cls(body=body)
+
+            operations = {
+                "validate": lambda msg: msg.validate(),
+                "str": str,
+                "summary": lambda msg: msg.summary,
+                "agent_avatar": lambda msg: msg.agent_avatar,
+            }
+            results[cls.__name__ + ".construct"] = _best(factory, number)
+            for operation, func in operations.items():
+                results[cls.__name__ + "." + operation] = _best_each(
+                    factory, func, number
+                )
+            results[cls.__name__ + ".get_message_object_from_topic"] = _best(
+                lambda: get_message_object_from_topic(cls.topic), number
+            )
+    finally:
+        validation.cache.enabled = enabled
+    return results
+
+
+def bench_import(number=1000):
+    """Time importing the package in a fresh interpreter, ``number`` is ignored."""
+    code = (
+        "import time; start = time.perf_counter(); import fedocal_messages; "
+        "print(time.perf_counter() - start)"
+    )
+    times = [
+        float(subprocess.check_output([sys.executable, "-c", code])) for _ in range(3)
+    ]
+    return {"fedocal_messages": min(times)}
+
+
+def bench_validate(number=1000):
+    """Compare the ways of validating a message with a plain jsonschema validation."""
+    msg = MeetingNewV1(body=SAMPLE_BODY)
+    enabled = validation.cache.enabled
+    validation.cache.enabled = False
+    try:
+        jsonschema = _best(lambda: message.Message.validate(msg), number)
+        compiled = _best(msg.validate, number)
+        msg.fast_validation = True
+        fast = _best(msg.validate, number)
+        msg.fast_validation = False
+        validation.cache.enabled = True
+        result_cache = _best(msg.validate, number)
+    finally:
+        validation.cache.enabled = enabled
+    return {
+        "jsonschema": jsonschema,
+        "compiled": compiled,
+        "fast": fast,
+        "result_cache": result_cache,
+        "speedup": jsonschema / fast,
+    }
+
+
+def bench_validate_many(number=1000):
+    """Compare validating a batch of messages in one process and in all CPUs."""
+    # Distinct bodies, so that nothing is validated only once whatever the cache.
+    messages = [
+        MeetingNewV1(
+            body=dict(SAMPLE_BODY, meeting=dict(SAMPLE_MEETING, meeting_id=index))
+        )
+        for index in range(number)
+    ]
+    workers = os.cpu_count() or 1
+    enabled = validation.cache.enabled
+    validation.cache.enabled = False
+    try:
+        serial = _best(lambda: validate_many(messages), 1, repeat=1) / number
+        parallel = (
+            _best(lambda: validate_many(messages, workers=workers), 1, repeat=1)
+            / number
+        )
+    finally:
+        validation.cache.enabled = enabled
+    return {"serial": serial, "workers": parallel, "speedup": serial / parallel}
+
+
+def _sample_meetings(number, distinct=50):
+    """Return meetings starting at ``distinct`` different times."""
+    start = datetime.datetime(2020, 3, 5, 16, 0)
+    meetings = []
+    for index in range(number):
+        meeting_dt = start + datetime.timedelta(hours=7 * (index % distinct))
+        meeting = dict(SAMPLE_MEETING)
+        meeting["meeting_date"] = meeting_dt.strftime("%Y-%m-%d")
+        meeting["meeting_time_start"] = meeting_dt.strftime("%H:%M:%S")
+        meetings.append(meeting)
+    return meetings
+
+
+def bench_reminder_strings(number=1000):
+    """Compare computing reminder time strings one by one and in a batch."""
+    meetings = _sample_meetings(number)
+    now = datetime.datetime(2020, 3, 1, 12, 0)
+    scalar = _best(
+        lambda: [_casual_timedelta_string(meeting, now) for meeting in meetings], 1
+    )
+    batch = _best(lambda: casual_timedelta_strings(meetings, now), 1)
+    return {
+        "scalar": scalar / number,
+        "batch": batch / number,
+        "speedup": scalar / batch,
+    }
+
+
+def bench_parse_datetime(number=1000):
+    """Compare the ways of parsing the start of a meeting."""
+    date = SAMPLE_MEETING["meeting_date"]
+    time = SAMPLE_MEETING["meeting_time_start"]
+    strptime = _best(
+        lambda: datetime.datetime.strptime(date + " " + time, "%Y-%m-%d %H:%M:%S"),
+        number,
+    )
+    sliced = _best(
+        lambda: timeutils.parse_meeting_datetime.__wrapped__(date, time), number
+    )
+    cached = _best(lambda: timeutils.parse_meeting_datetime(date, time), number)
+    return {
+        "strptime": strptime,
+        "sliced": sliced,
+        "cached": cached,
+        "speedup": strptime / cached,
+    }
+
+
+def bench_meeting_times(number=1000):
+    """Compare reading the UTC and the local start of meetings."""
+    meeting = dict(SAMPLE_MEETING, meeting_timezone="Europe/Paris")
+    utc_start = timeutils.parse_meeting_datetime(
+        meeting["meeting_date"], meeting["meeting_time_start"]
+    )
+    naive = _best(lambda: Meeting(meeting).start, number)
+    local = _best(lambda: Meeting(meeting).start_local, number)
+    uncached = _best(
+        lambda: utc_start.replace(tzinfo=dateutil.tz.UTC).astimezone(
+            dateutil.tz.gettz("Europe/Paris")
+        ),
+        number,
+    )
+    return {
+        "naive": naive,
+        "local": local,
+        "uncached_conversion": uncached,
+        "overhead": local / naive,
+    }
+
+
+def bench_synthetic(number=1000):
+    """Time generating synthetic traffic, as records and as archive lines."""
+    records = _best(lambda: collections.deque(TrafficGenerator().records(number), 0), 1)
+    write = _best(lambda: TrafficGenerator().write(io.StringIO(), number), 1)
+    return {"records": records / number, "write": write / number}
+
+
+def bench_coalesce(number=1000):
+    """Time coalescing a stream of updates about a few meetings."""
+    messages = [
+        MeetingUpdateV1(
+            body=dict(SAMPLE_BODY, meeting=dict(SAMPLE_MEETING, meeting_id=index % 50))
+        )
+        for index in range(number)
+    ]
+
+    def run():
+        # A millisecond passes between two messages.
+        clock = itertools.count(0, 0.001).__next__
+        stream = coalesce(messages, window=1, max_pending=100, clock=clock)
+        collections.deque(stream, 0)
+
+    return {"updates": _best(run, 1) / number}
+
+
+def bench_scheduler(number=1000):
+    """Time scheduling, rescheduling and cancelling reminders, then sending them."""
+    now = datetime.datetime(2020, 3, 1, 12, 0)
+    # Sharing the properties makes building the messages much faster.
+    properties = MeetingNewV1()._properties
+
+    def meeting_message(cls, index, start):
+        meeting = dict(
+            SAMPLE_MEETING,
+            meeting_id=index,
+            meeting_date=start.strftime("%Y-%m-%d"),
+            meeting_time_start=start.strftime("%H:%M:%S"),
+        )
+        body = dict(SAMPLE_BODY, meeting=meeting)
+        return cls(body=body, properties=properties)
+
+    starts = [now + datetime.timedelta(minutes=2 + index) for index in range(number)]
+    messages = [
+        meeting_message(MeetingNewV1, i, start) for i, start in enumerate(starts)
+    ]
+    messages += [
+        meeting_message(MeetingUpdateV1, i, starts[i] + datetime.timedelta(hours=1))
+        for i in range(0, number, 2)
+    ]
+    messages += [
+        meeting_message(MeetingDeleteV1, i, starts[i]) for i in range(1, number, 4)
+    ]
+    # Parse the meeting starts beforehand, only the scheduling is timed.
+    for msg in messages:
+        msg.meeting.start
+    lead = datetime.timedelta(hours=1)
+    later = now + datetime.timedelta(minutes=number + 120)
+    push = pop_due = float("inf")
+    for _ in range(3):
+        scheduler = ReminderScheduler(lead=lead, clock=lambda: now)
+        push = min(
+            push, timeit.timeit(lambda: list(map(scheduler.push, messages)), number=1)
+        )
+        pop_due = min(
+            pop_due, timeit.timeit(lambda: scheduler.pop_due(later), number=1)
+        )
+    return {"push": push / len(messages), "pop_due": pop_due / number}
+
+
+BENCHMARKS = {
+    "coalesce": bench_coalesce,
+    "import": bench_import,
+    "meeting_times": bench_meeting_times,
+    "messages": bench_messages,
+    "parse_datetime": bench_parse_datetime,
+    "reminder_strings": bench_reminder_strings,
+    "scheduler": bench_scheduler,
+    "synthetic": bench_synthetic,
+    "validate": bench_validate,
+    "validate_many": bench_validate_many,
+}
+
+
+def _parse_threshold(value):
+    """Parse a ``FRACTION`` or ``PATTERN=FRACTION`` threshold argument."""
+    pattern, _, fraction = value.rpartition("=")
+    try:
+        return (pattern or "*", float(fraction))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid threshold: {}".format(value))
+
+
+def find_regressions(results, baseline, thresholds):
+    """
+    Return the timings that got slower than their threshold allows.
+
+    Args:
+        results (dict): The timings of this run, by name.
+        baseline (dict): The timings to compare with, by name.
+        thresholds (list): ``(pattern, fraction)`` pairs. A timing may get slower
+            by the fraction of the last pattern matching its name.
+
+    Returns:
+        list: ``(name, baseline, result)`` tuples.
+    """
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline or name.rpartition(".")[2] in RATIOS:
+            continue
+        allowed = 0
+        for pattern, fraction in thresholds:
+            if fnmatch.fnmatchcase(name, pattern):
+                allowed = fraction
+        if value > baseline[name] * (1 + allowed):
+            regressions.append((name, baseline[name], value))
+    return regressions
+
+
+def main(argv=None):
+    """
+    Run the benchmarks and print the time per call of each variant.
+
+    Returns:
+        int: 1 if a regression was found when comparing with a baseline, else 0.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=1000)
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("-c", "--compare", help="compare with this JSON results file")
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        action="append",
+        type=_parse_threshold,
+        default=[("*", 0.25)],
+        metavar="[PATTERN=]FRACTION",
+        help="allowed slowdown, for the timings matching PATTERN (default: 0.25)",
+    )
+    parser.add_argument("names", nargs="*", metavar="name", help="benchmarks to run")
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: {}".format(name))
+
+    results = {}
+    for name in args.names or sorted(BENCHMARKS):
+        for variant, value in BENCHMARKS[name](number=args.number).items():
+            results[name + "." + variant] = value
+            if variant in RATIOS:
+                print("{}: {} x{:.1f}".format(name, variant, value))
+            else:
+                print("{}: {} {:.2f} us".format(name, variant, value * 1e6))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"python": platform.python_version(), "results": results},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(
+                "REGRESSION {}: {:.2f} us -> {:.2f} us (+{:.0%})".format(
+                    name, before * 1e6, after * 1e6, after / before - 1
+                )
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Coalescing of the bursts of meeting updates published by fedocal."""
+
+import collections
+import time
+
+from .messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    MeetingDeleteV1,
+    MeetingUpdateV1,
+)
+
+
+class UpdateCoalescer:
+    """
+    Collapse bursts of :class:`MeetingUpdateV1` messages about the same meeting.
+
+    The first update of a meeting is held for ``window`` seconds. Updates of the
+    same meeting arriving meanwhile replace it, and the latest one is released
+    when the window ends. A :class:`MeetingDeleteV1` cancels the held update of
+    its meeting, and a :class:`CalendarClearV1` or :class:`CalendarDeleteV1` those
+    of the meetings of its calendar. Every other message goes through right away.
+
+    Args:
+        window (float): How long, in seconds, updates are held.
+        max_pending (int): The maximum number of meetings with a held update.
+            When it is reached, the oldest held update is released early.
+        clock (callable): A function returning the current time in seconds.
+            Defaults to :func:`time.monotonic`.
+
+    Attributes:
+        coalesced (int): How many updates were replaced by a later one.
+        cancelled (int): How many held updates were cancelled by a delete or a
+            clear.
+    """
+
+    def __init__(self, window=5.0, max_pending=10000, clock=time.monotonic):
+        self.window = window
+        self.max_pending = max_pending
+        self.clock = clock
+        self.coalesced = 0
+        self.cancelled = 0
+        # Maps meeting ids to [deadline, message]. Deadlines only grow, so the
+        # insertion order is also the order in which updates are released.
+        self._pending = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def push(self, message):
+        """
+        Add a message to the stream.
+
+        Returns:
+            list: The messages ready to be handled, in order.
+        """
+        now = self.clock()
+        ready = self._release(now)
+        if isinstance(message, MeetingUpdateV1):
+            meeting_id = message.body["meeting"]["meeting_id"]
+            entry = self._pending.get(meeting_id)
+            if entry is not None:
+                entry[1] = message
+                self.coalesced += 1
+            else:
+                self._pending[meeting_id] = [now + self.window, message]
+                if len(self._pending) > self.max_pending:
+                    ready.append(self._pending.popitem(last=False)[1][1])
+        else:
+            if isinstance(message, MeetingDeleteV1):
+                meeting_id = message.body["meeting"]["meeting_id"]
+                if self._pending.pop(meeting_id, None) is not None:
+                    self.cancelled += 1
+            elif isinstance(message, (CalendarClearV1, CalendarDeleteV1)):
+                self._cancel_calendar(message.body["calendar"]["calendar_name"])
+            ready.append(message)
+        return ready
+
+    def _cancel_calendar(self, name):
+        """Cancel the held updates of the meetings of a calendar."""
+        cancelled = [
+            meeting_id
+            for meeting_id, (_, message) in self._pending.items()
+            if message.body["calendar"]["calendar_name"] == name
+        ]
+        for meeting_id in cancelled:
+            del self._pending[meeting_id]
+        self.cancelled += len(cancelled)
+
+    def poll(self):
+        """
+        Release the updates whose window has ended.
+
+        Returns:
+            list: The messages ready to be handled, in order.
+        """
+        return self._release(self.clock())
+
+    def flush(self):
+        """
+        Release every held update.
+
+        Returns:
+            list: The messages ready to be handled, in order.
+        """
+        ready = [message for _, message in self._pending.values()]
+        self._pending.clear()
+        return ready
+
+    def _release(self, now):
+        ready = []
+        pending = self._pending
+        while pending:
+            meeting_id, (deadline, message) = next(iter(pending.items()))
+            if deadline > now:
+                break
+            del pending[meeting_id]
+            ready.append(message)
+        return ready
+
+
+def coalesce(messages, window=5.0, max_pending=10000, clock=time.monotonic):
+    """
+    Collapse the bursts of meeting updates in a stream of fedocal messages.
+
+    See :class:`UpdateCoalescer` for the arguments. The updates still held when
+    the stream ends are released then.
+
+    Yields:
+        fedora_messaging.message.Message: The messages to handle.
+    """
+    coalescer = UpdateCoalescer(window=window, max_pending=max_pending, clock=clock)
+    for message in messages:
+        yield from coalescer.push(message)
+    yield from coalescer.flush()
@@ -0,0 +1,311 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Columnar export of fedocal messages, for analytics.
+
+This module requires NumPy, and pyarrow for the Arrow export. Install the
+``columnar`` or ``arrow`` extra to get them.
+"""
+
+import numbers
+
+import numpy
+
+from . import timeutils
+from .base import CALENDAR, MEETING
+
+
+# The layout of the meeting fields holding dates and times.
+_DATES = ("meeting_date", "meeting_date_end")
+_TIMES = ("meeting_time_start", "meeting_time_stop")
+
+# Columns computed from a date and a time column.
+_DATETIMES = (
+    ("meeting_start", "meeting_date", "meeting_time_start"),
+    ("meeting_end", "meeting_date_end", "meeting_time_stop"),
+)
+
+_DTYPES = {
+    "string": numpy.int32,
+    "strings": numpy.int32,
+    "number": numpy.float64,
+    "date": "datetime64[D]",
+    "time": "timedelta64[s]",
+    "datetime": "datetime64[s]",
+}
+
+
+def _kind(name, schema):
+    if name in _DATES:
+        return "date"
+    if name in _TIMES:
+        return "time"
+    types = schema["type"]
+    if types == "number":
+        return "number"
+    if types == "array":
+        return "strings"
+    return "string"
+
+
+def _columns():
+    """Return the ``(column, source, field, kind)`` of each exported column."""
+    columns = [
+        ("topic", "message", "topic", "string"),
+        ("sent_at", "message", "sent-at", "datetime"),
+        ("agent", "message", "agent", "string"),
+    ]
+    for name, schema in CALENDAR["properties"].items():
+        columns.append((name, "calendar", name, _kind(name, schema)))
+    for name, schema in MEETING["properties"].items():
+        column = name if name.startswith("meeting_") else "meeting_" + name
+        columns.append((column, "meeting", name, _kind(name, schema)))
+    for column, _, _ in _DATETIMES:
+        columns.append((column, "meeting", None, "datetime"))
+    return tuple(columns)
+
+
+COLUMNS = _columns()
+
+
+class Dictionary:
+    """
+    The distinct values of a dictionary-encoded column.
+
+    Values are given codes in the order they are first seen, so the codes of a
+    chunk stay valid when the following chunks add values. Missing values are
+    encoded as ``-1``.
+
+    Attributes:
+        values (list): The values, indexed by their code.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """Return the code of a value, adding it if it is new."""
+        if value is None:
+            return -1
+        try:
+            return self._codes[value]
+        except KeyError:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+            return code
+
+    def decode(self, codes):
+        """Return the values of codes, with ``None`` for missing values."""
+        values = self.values
+        return [values[code] if code >= 0 else None for code in codes]
+
+
+def _string(value):
+    return value if isinstance(value, str) else None
+
+
+def _strings(value):
+    if not isinstance(value, list):
+        return None
+    return tuple(item if isinstance(item, str) else None for item in value)
+
+
+def _number(value):
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return value
+    return numpy.nan
+
+
+def _parse(values, unit):
+    """Parse ISO 8601 strings into an array of datetimes, with NaT when invalid."""
+    strings = [value if isinstance(value, str) else "NaT" for value in values]
+    dtype = "datetime64[{}]".format(unit)
+    try:
+        return numpy.array(strings, dtype=dtype)
+    except ValueError:
+        output = numpy.empty(len(strings), dtype=dtype)
+        for index, value in enumerate(strings):
+            try:
+                output[index] = numpy.datetime64(value, unit)
+            except ValueError:
+                output[index] = numpy.datetime64("NaT")
+        return output
+
+
+class ColumnarExporter:
+    """
+    Turn fedocal messages into columns, one chunk at a time.
+
+    Each chunk is a NumPy structured array with one field per column of
+    :data:`COLUMNS`: the topic, time sent and agent of the messages, then one
+    column per field of the ``CALENDAR`` and ``MEETING`` schemas, then the start
+    and end of the meetings. Fields missing from a message are missing values.
+
+    * Strings are dictionary-encoded as ``int32`` codes into
+      :attr:`dictionaries`, which are shared by all the chunks. Lists of strings,
+      like ``meeting_manager``, are encoded as tuples.
+    * Numbers are ``float64``, with NaN for missing values.
+    * Dates are ``datetime64[D]``, times of day ``timedelta64[s]`` and datetimes
+      ``datetime64[s]`` in UTC, with NaT for missing values.
+
+    Only one chunk of messages is held at once, so memory stays bounded by the
+    chunk size and the number of distinct strings.
+
+    Args:
+        chunksize (int): The maximum number of rows of a chunk.
+
+    Attributes:
+        dtype (numpy.dtype): The dtype of the chunks.
+        dictionaries (dict): The :class:`Dictionary` of each dictionary-encoded
+            column, by column name.
+    """
+
+    def __init__(self, chunksize=10000):
+        self.chunksize = chunksize
+        self.dtype = numpy.dtype(
+            [(column, _DTYPES[kind]) for column, _, _, kind in COLUMNS]
+        )
+        self.dictionaries = {
+            column: Dictionary()
+            for column, _, _, kind in COLUMNS
+            if kind in ("string", "strings")
+        }
+
+    def chunks(self, messages):
+        """
+        Export messages, one chunk at a time.
+
+        Yields:
+            numpy.ndarray: The structured arrays of the chunks.
+        """
+        rows = []
+        for message in messages:
+            rows.append(message)
+            if len(rows) >= self.chunksize:
+                yield self._chunk(rows)
+                rows = []
+        if rows:
+            yield self._chunk(rows)
+
+    def to_numpy(self, messages):
+        """
+        Export messages into a single structured array.
+
+        Returns:
+            numpy.ndarray: The structured array.
+        """
+        chunks = list(self.chunks(messages))
+        if not chunks:
+            return numpy.empty(0, dtype=self.dtype)
+        return numpy.concatenate(chunks)
+
+    def _chunk(self, messages):
+        """Build the structured array of a chunk of messages."""
+        sources = {"message": [], "calendar": [], "meeting": []}
+        for message in messages:
+            body = message.body
+            calendar = body.get("calendar")
+            meeting = body.get("meeting")
+            sources["message"].append(
+                {
+                    "topic": message.topic,
+                    "sent-at": message._headers.get("sent-at"),
+                    "agent": body.get("agent"),
+                }
+            )
+            sources["calendar"].append(calendar if isinstance(calendar, dict) else {})
+            sources["meeting"].append(meeting if isinstance(meeting, dict) else {})
+
+        chunk = numpy.empty(len(messages), dtype=self.dtype)
+        for column, source, field, kind in COLUMNS:
+            if field is None:
+                continue
+            values = [data.get(field) for data in sources[source]]
+            if kind == "string":
+                encode = self.dictionaries[column].encode
+                chunk[column] = [encode(_string(value)) for value in values]
+            elif kind == "strings":
+                encode = self.dictionaries[column].encode
+                chunk[column] = [encode(_strings(value)) for value in values]
+            elif kind == "number":
+                chunk[column] = [_number(value) for value in values]
+            elif kind == "date":
+                chunk[column] = _parse(values, "D")
+            elif kind == "time":
+                times = ["1970-01-01T" + v if isinstance(v, str) else v for v in values]
+                chunk[column] = _parse(times, "s") - numpy.datetime64(0, "s")
+            else:
+                sent_at = [timeutils.parse_sent_at(value) for value in values]
+                chunk[column] = numpy.array(sent_at, dtype="datetime64[s]")
+        for column, date, time in _DATETIMES:
+            chunk[column] = chunk[date] + chunk[time]
+        return chunk
+
+    def arrow_batches(self, messages):
+        """
+        Export messages into Arrow record batches, one chunk at a time.
+
+        Strings become dictionary arrays, lists of strings become list arrays, and
+        missing values become nulls.
+
+        Yields:
+            pyarrow.RecordBatch: The record batches of the chunks.
+        """
+        for chunk in self.chunks(messages):
+            yield self._to_arrow(chunk)
+
+    def to_arrow(self, messages):
+        """
+        Export messages into an Arrow table.
+
+        Returns:
+            pyarrow.Table: The table, with one record batch per chunk.
+        """
+        import pyarrow
+
+        schema = self._to_arrow(numpy.empty(0, dtype=self.dtype)).schema
+        return pyarrow.Table.from_batches(self.arrow_batches(messages), schema=schema)
+
+    def _to_arrow(self, chunk):
+        """Convert a chunk into an Arrow record batch."""
+        import pyarrow
+
+        arrays = []
+        for column, _, _, kind in COLUMNS:
+            values = chunk[column]
+            if kind == "string":
+                array = pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(values, mask=values < 0),
+                    pyarrow.array(self.dictionaries[column].values, pyarrow.string()),
+                )
+            elif kind == "strings":
+                array = pyarrow.array(
+                    self.dictionaries[column].decode(values),
+                    pyarrow.list_(pyarrow.string()),
+                )
+            elif kind == "number":
+                array = pyarrow.array(values, mask=numpy.isnan(values))
+            else:
+                array = pyarrow.array(values, mask=numpy.isnat(values))
+            arrays.append(array)
+        return pyarrow.RecordBatch.from_arrays(
+            arrays, names=[column for column, _, _, _ in COLUMNS]
+        )
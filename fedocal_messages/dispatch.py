@@ -0,0 +1,200 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Dispatching of fedocal messages to asynchronous handlers."""
+
+import asyncio
+import collections
+import inspect
+import logging
+
+from .base import FedocalMessage
+from .registry import find_class
+
+
+_log = logging.getLogger(__name__)
+
+
+def calendar_key(message):
+    """Return the name of the calendar a message is about."""
+    return message.calendar.calendar_name
+
+
+class Dispatcher:
+    """
+    Run the handlers registered for the class of each message.
+
+    Handlers of different messages run concurrently, up to ``concurrency`` at
+    once, except for messages with the same key: those wait in a queue of their
+    key and are handled one after the other, in the order they were dispatched.
+    They only take one of the ``concurrency`` slots when their turn comes, so a
+    busy key does not hold back the others. By default, messages about the same
+    calendar share a key.
+
+    Handlers raising an exception are logged and counted in :attr:`failed`, the
+    following messages are still handled.
+
+    Args:
+        concurrency (int): The maximum number of messages handled at once.
+        key (callable): A function returning the key of a message, or ``None``
+            to not order the messages at all. Defaults to :func:`calendar_key`.
+        max_pending (int): The maximum number of messages dispatched and not
+            handled yet. When it is reached, dispatching waits.
+
+    Attributes:
+        handled (int): How many messages were handled.
+        unhandled (int): How many messages had no handler.
+        failed (int): How many messages had a handler raise an exception.
+    """
+
+    def __init__(self, concurrency=10, key=calendar_key, max_pending=1000):
+        self.concurrency = concurrency
+        self.key = key
+        self.max_pending = max_pending
+        self.handled = 0
+        self.unhandled = 0
+        self.failed = 0
+        self._handlers = {}
+        # The handlers of each message class, including those registered for its
+        # base classes.
+        self._resolved = {}
+        # Created on first use, to be bound to the running event loop.
+        self._semaphore = None
+        self._pending = None
+        # The messages waiting behind the one being handled, for each key.
+        self._queues = {}
+        self._tasks = set()
+
+    def register(self, cls, handler=None):
+        """
+        Register a handler for the messages of a class and of its sub-classes.
+
+        Can be used as a decorator. Handlers are called with the message, and may
+        be coroutine functions.
+
+        Args:
+            cls (type): A :class:`FedocalMessage` sub-class.
+            handler (callable): The handler.
+
+        Returns:
+            callable: The handler.
+        """
+        if handler is None:
+            return lambda handler: self.register(cls, handler)
+        self._handlers.setdefault(cls, []).append(handler)
+        self._resolved.clear()
+        return handler
+
+    def handlers(self, cls):
+        """Return the handlers of a message class, in the order they are called."""
+        try:
+            return self._resolved[cls]
+        except KeyError:
+            handlers = self._resolved[cls] = [
+                handler
+                for base in reversed(cls.__mro__)
+                for handler in self._handlers.get(base, ())
+            ]
+            return handlers
+
+    def _message(self, item):
+        """Return the message of a source item, or ``None`` if it is not fedocal's."""
+        if isinstance(item, FedocalMessage):
+            return item
+        topic, body = item
+        cls = find_class(topic)
+        if cls is None or not issubclass(cls, FedocalMessage):
+            return None
+        return cls(body=body, topic=topic)
+
+    async def dispatch(self, item):
+        """
+        Schedule the handling of a message.
+
+        This waits while ``max_pending`` messages are dispatched and not handled
+        yet, but not for the message to be handled: use :meth:`join` for that.
+
+        Args:
+            item: A :class:`FedocalMessage`, or a ``(topic, body)`` pair whose class
+                is found from the topic, which may carry an environment prefix.
+        """
+        message = self._message(item)
+        handlers = self.handlers(type(message)) if message is not None else ()
+        if not handlers:
+            self.unhandled += 1
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._pending = asyncio.Semaphore(self.max_pending)
+        await self._pending.acquire()
+        if self.key is None:
+            self._start(collections.deque([(message, handlers)]), None)
+            return
+        key = self.key(message)
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((message, handlers))
+        else:
+            queue = self._queues[key] = collections.deque([(message, handlers)])
+            self._start(queue, key)
+
+    def _start(self, queue, key):
+        task = asyncio.ensure_future(self._drain(queue, key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, queue, key):
+        """Handle the messages of a queue in order, until it is empty."""
+        while queue:
+            message, handlers = queue.popleft()
+            async with self._semaphore:
+                await self._handle(message, handlers)
+            self._pending.release()
+        if self.key is not None:
+            del self._queues[key]
+
+    async def _handle(self, message, handlers):
+        try:
+            for handler in handlers:
+                result = handler(message)
+                if inspect.isawaitable(result):
+                    await result
+        except Exception:
+            self.failed += 1
+            _log.exception("Failed to handle the message %s", message.id)
+        else:
+            self.handled += 1
+
+    async def join(self):
+        """Wait until every dispatched message is handled."""
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    async def run(self, source):
+        """
+        Dispatch the messages of a source and wait until they are handled.
+
+        Args:
+            source: An iterable or asynchronous iterable of the items accepted by
+                :meth:`dispatch`.
+        """
+        if hasattr(source, "__aiter__"):
+            async for item in source:
+                await self.dispatch(item)
+        else:
+            for item in source:
+                await self.dispatch(item)
+        await self.join()
@@ -0,0 +1,160 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""An in-memory index of the current meetings, kept up to date from messages."""
+
+from .messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+)
+
+
+class MeetingIndex:
+    """
+    The current meetings, indexed by id, by calendar and by start date.
+
+    The index is built by applying the messages fedocal publishes, in order:
+    new and updated meetings are added or replaced, deleted meetings are removed,
+    and clearing or deleting a calendar removes all its meetings. Other messages
+    are ignored.
+
+    Meetings are indexed under the name of the calendar of their message, and
+    under the UTC date they start on. Meetings with an invalid start are not
+    indexed by date.
+    """
+
+    def __init__(self):
+        # Maps meeting ids to (meeting, calendar name, start date).
+        self._entries = {}
+        self._by_calendar = {}
+        self._by_date = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, meeting_id):
+        return meeting_id in self._entries
+
+    def __iter__(self):
+        return (meeting for meeting, _, _ in self._entries.values())
+
+    def get(self, meeting_id, default=None):
+        """
+        Return a meeting by id.
+
+        Returns:
+            fedocal_messages.base.Meeting: The meeting, or ``default``.
+        """
+        try:
+            return self._entries[meeting_id][0]
+        except KeyError:
+            return default
+
+    def by_calendar(self, calendar_name):
+        """
+        Return the meetings of a calendar.
+
+        Returns:
+            list: The :class:`fedocal_messages.base.Meeting` of the calendar.
+        """
+        ids = self._by_calendar.get(calendar_name, ())
+        return [self._entries[meeting_id][0] for meeting_id in ids]
+
+    def by_date(self, date):
+        """
+        Return the meetings starting on a date.
+
+        Args:
+            date (datetime.date): The UTC date.
+
+        Returns:
+            list: The :class:`fedocal_messages.base.Meeting` starting that day.
+        """
+        ids = self._by_date.get(date, ())
+        return [self._entries[meeting_id][0] for meeting_id in ids]
+
+    def calendars(self):
+        """Return the names of the calendars with meetings."""
+        return list(self._by_calendar)
+
+    def apply(self, message):
+        """
+        Apply a message to the index.
+
+        Returns:
+            bool: Whether the index changed.
+        """
+        if isinstance(message, (MeetingNewV1, MeetingUpdateV1)):
+            meeting = message.meeting
+            self._remove(meeting.meeting_id)
+            self._add(meeting, message.calendar.calendar_name or meeting.calendar_name)
+            return True
+        if isinstance(message, MeetingDeleteV1):
+            return self._remove(message.meeting.meeting_id)
+        if isinstance(message, (CalendarClearV1, CalendarDeleteV1)):
+            return self._remove_calendar(message.calendar.calendar_name)
+        return False
+
+    def apply_many(self, messages):
+        """
+        Apply messages to the index, in order.
+
+        Returns:
+            int: How many messages changed the index.
+        """
+        return sum(self.apply(message) for message in messages)
+
+    def _add(self, meeting, calendar_name):
+        try:
+            date = meeting.start.date()
+        except (TypeError, ValueError):
+            date = None
+        meeting_id = meeting.meeting_id
+        self._entries[meeting_id] = (meeting, calendar_name, date)
+        self._by_calendar.setdefault(calendar_name, set()).add(meeting_id)
+        if date is not None:
+            self._by_date.setdefault(date, set()).add(meeting_id)
+
+    def _remove(self, meeting_id):
+        entry = self._entries.pop(meeting_id, None)
+        if entry is None:
+            return False
+        _, calendar_name, date = entry
+        _discard(self._by_calendar, calendar_name, meeting_id)
+        if date is not None:
+            _discard(self._by_date, date, meeting_id)
+        return True
+
+    def _remove_calendar(self, calendar_name):
+        ids = self._by_calendar.pop(calendar_name, None)
+        if ids is None:
+            return False
+        for meeting_id in ids:
+            date = self._entries.pop(meeting_id)[2]
+            if date is not None:
+                _discard(self._by_date, date, meeting_id)
+        return True
+
+
+def _discard(index, key, meeting_id):
+    """Remove a meeting id from a secondary index, dropping empty keys."""
+    ids = index[key]
+    ids.discard(meeting_id)
+    if not ids:
+        del index[key]
@@ -16,30 +16,46 @@
 
 import datetime
 
-import dateutil.relativedelta
+from . import timeutils
+from .base import CALENDAR, FedocalMessage, MEETING, SCHEMA_URL, memoized
 
-from .base import CALENDAR, FedocalMessage, MEETING, SCHEMA_URL
 
+# Adding or removing a month moves a date by at least 28 days, so closer
+# datetimes are less than a month apart and their relativedelta is plain
+# arithmetic on the timedelta.
+_MONTHLESS = datetime.timedelta(days=28)
 
-def _casual_timedelta_string(meeting):
-    """Return a casual timedelta string.
-    If a meeting starts in 2 hours, 15 minutes, and 32 seconds from now, then
-    return just "in 2 hours".
-    If a meeting starts in 7 minutes and 40 seconds from now, return just "in 7
-    minutes".
-    If a meeting starts 56 seconds from now, just return "right now".
+
+def _relative_parts(meeting_dt, now):
+    """
+    Return the years, months, days, hours and minutes from now to meeting_dt.
+
+    They are the values :class:`dateutil.relativedelta.relativedelta` computes.
     """
+    delta = meeting_dt - now
+    if abs(delta) >= _MONTHLESS:
+        import dateutil.relativedelta
+
+        relative_td = dateutil.relativedelta.relativedelta(meeting_dt, now)
+        return (
+            relative_td.years,
+            relative_td.months,
+            relative_td.days,
+            relative_td.hours,
+            relative_td.minutes,
+        )
+    # Like relativedelta, drop the microseconds and split the absolute value.
+    seconds = delta.days * 86400 + delta.seconds
+    sign = -1 if seconds < 0 else 1
+    minutes = seconds * sign // 60
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    return 0, 0, days * sign, hours * sign, minutes * sign
 
-    now = datetime.datetime.utcnow()
-    mdate = meeting["meeting_date"]
-    mtime = meeting["meeting_time_start"]
-    dt_string = "%s %s" % (mdate, mtime)
-    meeting_dt = datetime.datetime.strptime(dt_string, "%Y-%m-%d %H:%M:%S")
-    relative_td = dateutil.relativedelta.relativedelta(meeting_dt, now)
 
+def _casual_string(meeting_dt, now):
     denominations = ["years", "months", "days", "hours", "minutes"]
-    for denomination in denominations:
-        value = getattr(relative_td, denomination)
+    for denomination, value in zip(denominations, _relative_parts(meeting_dt, now)):
         if value:
             # If the value is only one, then strip off the plural suffix.
             if value == 1:
@@ -49,6 +65,52 @@ def _casual_timedelta_string(meeting):
     return "right now"
 
 
+def _casual_timedelta_string(meeting, now):
+    """Return a casual timedelta string.
+    If a meeting starts in 2 hours, 15 minutes, and 32 seconds from now, then
+    return just "in 2 hours".
+    If a meeting starts in 7 minutes and 40 seconds from now, return just "in 7
+    minutes".
+    If a meeting starts 56 seconds from now, just return "right now".
+    The reference time ``now`` is a naive UTC datetime.
+    """
+
+    meeting_dt = timeutils.parse_meeting_datetime(
+        meeting["meeting_date"], meeting["meeting_time_start"]
+    )
+    return _casual_string(meeting_dt, now)
+
+
+def casual_timedelta_strings(meetings, now=None):
+    """
+    Return the casual timedelta string of many meetings.
+
+    All the meetings are compared to the same reference time, and meetings
+    starting at the same time are only computed once.
+
+    Args:
+        meetings (iterable): The meeting dictionaries.
+        now (datetime.datetime): The naive UTC reference time. Defaults to the
+            current time.
+
+    Returns:
+        list: The casual timedelta string of each meeting, in order.
+    """
+    if now is None:
+        now = timeutils.utcnow()
+    computed = {}
+    output = []
+    for meeting in meetings:
+        key = (meeting["meeting_date"], meeting["meeting_time_start"])
+        try:
+            text = computed[key]
+        except KeyError:
+            meeting_dt = timeutils.parse_meeting_datetime(*key)
+            text = computed[key] = _casual_string(meeting_dt, now)
+        output.append(text)
+    return output
+
+
 class ReminderV1(FedocalMessage):
     """
     A sub-class of a Fedora message that defines a message schema for messages
@@ -57,6 +119,11 @@ class ReminderV1(FedocalMessage):
 
     topic = "fedocal.meeting.reminder"
 
+    # Set on a message to a function returning the current naive UTC time to
+    # use it instead of fedocal_messages.timeutils.utcnow. When set on a class,
+    # wrap the function with staticmethod so that it is not called with the message.
+    clock = None
+
     body_schema = {
         "id": SCHEMA_URL + topic,
         "$schema": "http://json-schema.org/draft-04/schema#",
@@ -68,16 +135,37 @@ class ReminderV1(FedocalMessage):
 
     def __str__(self):
         """Return a complete human-readable representation of the message."""
-        return (
+        return self.render()
+
+    def render(self, now=None):
+        """
+        Return a complete human-readable representation of the message.
+
+        The text rendered for the latest reference time is kept on the message.
+
+        Args:
+            now (datetime.datetime): The naive UTC time the meeting start is
+                relative to. Defaults to the current time, as told by the message
+                clock if set or else by :func:`fedocal_messages.timeutils.utcnow`.
+        """
+        if now is None:
+            now = (self.clock or timeutils.utcnow)()
+        rendered = self._memo.get("render")
+        if rendered is not None and rendered[0] == now:
+            return rendered[1]
+        text = (
             "Friendly reminder!  The '{meeting}' meeting from "
             "the '{calendar}' calendar starts {timestring}".format(
                 meeting=self.body["meeting"]["meeting_name"],
                 calendar=self.body["calendar"]["calendar_name"],
-                timestring=_casual_timedelta_string(self.body["meeting"]),
+                timestring=_casual_timedelta_string(self.body["meeting"], now),
             )
         )
+        self._memo["render"] = (now, text)
+        return text
 
     @property
+    @memoized
     def summary(self):
         """Return a summary of the message."""
         return (
@@ -106,6 +194,7 @@ class CalendarNewV1(FedocalMessage):
         "required": ["calendar", "agent"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has created a new calendar {calendar}".format(
@@ -136,6 +225,7 @@ class CalendarUpdateV1(FedocalMessage):
         "required": ["calendar", "agent"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has updated a calendar {calendar}".format(
@@ -167,6 +257,7 @@ class CalendarUploadV1(FedocalMessage):
         "required": ["calendar", "agent"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has uploaded meetings in the calendar {calendar}".format(
@@ -197,6 +288,7 @@ class CalendarDeleteV1(FedocalMessage):
         "required": ["calendar", "agent"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has deleted the calendar {calendar}".format(
@@ -227,6 +319,7 @@ class CalendarClearV1(FedocalMessage):
         "required": ["calendar", "agent"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has cleared the calendar {calendar}".format(
@@ -261,6 +354,7 @@ class MeetingNewV1(FedocalMessage):
         "required": ["agent", "calendar", "meeting"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return (
@@ -299,6 +393,7 @@ class MeetingUpdateV1(FedocalMessage):
         "required": ["agent", "calendar", "meeting"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return "{user} has updated meeting {meeting} in calendar" " {calendar}".format(
@@ -334,6 +429,7 @@ class MeetingDeleteV1(FedocalMessage):
         "required": ["agent", "calendar", "meeting"],
     }
 
+    @memoized
     def __str__(self):
         """Return a complete human-readable representation of the message."""
         return (
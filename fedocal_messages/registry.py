@@ -0,0 +1,185 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""A registry of the message classes installed on the host, keyed by topic."""
+
+import functools
+import sys
+
+from .base import FedocalMessage
+
+
+if sys.version_info >= (3, 8):
+    from importlib import metadata
+else:  # pragma: no cover
+    import importlib_metadata as metadata
+
+
+_registry = None
+_trie = None
+
+# Key under which a trie node stores the class whose topic ends at that node.
+_LEAF = object()
+
+
+def _entry_points(group):
+    """Return the entry points of a group."""
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return entry_points.select(group=group)
+    # Python < 3.10 returns a dict of entry points by group.
+    return entry_points.get(group, [])  # pragma: no cover
+
+
+def _build_registry():
+    """Load every ``fedora.messages`` entry point and index it by topic."""
+    registry = {}
+    for entry_point in _entry_points("fedora.messages"):
+        cls = entry_point.load()
+        # The first class registered for a topic wins, as it always has.
+        registry.setdefault(cls.topic, cls)
+    return registry
+
+
+def get_registry():
+    """Return the topic to message class mapping, building it on first use."""
+    global _registry
+    if _registry is None:
+        _registry = _build_registry()
+    return _registry
+
+
+def refresh_registry():
+    """
+    Forget the known message classes.
+
+    The registry is rebuilt on the next lookup, which picks up schema packages
+    that were installed or removed since it was last built.
+    """
+    global _registry, _trie
+    _registry = None
+    _trie = None
+    _match_pattern.cache_clear()
+    find_class.cache_clear()
+
+
+@functools.lru_cache(maxsize=1024)
+def find_class(topic):
+    """
+    Return the message class of a topic, which may carry an environment prefix.
+
+    Messages consumed from the broker have topics like
+    ``org.fedoraproject.prod.fedocal.meeting.new``. When the topic is not
+    registered as it is, the fedocal topic it ends with, as whole dot-separated
+    words, is looked up instead.
+
+    Args:
+        topic (str): The topic.
+
+    Returns:
+        type: The message class, or ``None`` if the topic is unknown.
+    """
+    registry = get_registry()
+    cls = registry.get(topic)
+    if cls is not None:
+        return cls
+    start = topic.find(".")
+    while start != -1:
+        cls = registry.get(topic[start + 1 :])
+        if cls is not None and issubclass(cls, FedocalMessage):
+            return cls
+        start = topic.find(".", start + 1)
+    return None
+
+
+def _get_trie():
+    """Return the fedocal topics arranged as a trie of dot-separated words."""
+    global _trie
+    if _trie is None:
+        root = {}
+        for topic, cls in get_registry().items():
+            if not issubclass(cls, FedocalMessage):
+                continue
+            node = root
+            for word in topic.split("."):
+                node = node.setdefault(word, {})
+            node[_LEAF] = cls
+        _trie = root
+    return _trie
+
+
+def _walk(node, words, index, found):
+    """Collect the classes below ``node`` matching ``words[index:]``."""
+    if index == len(words):
+        if _LEAF in node:
+            found.append(node[_LEAF])
+        return
+    word = words[index]
+    if word == "#":
+        # "#" matches zero words, or one word and then possibly more.
+        _walk(node, words, index + 1, found)
+        for key, child in node.items():
+            if key is not _LEAF:
+                _walk(child, words, index, found)
+    elif word == "*":
+        for key, child in node.items():
+            if key is not _LEAF:
+                _walk(child, words, index + 1, found)
+    else:
+        child = node.get(word)
+        if child is not None:
+            _walk(child, words, index + 1, found)
+
+
+@functools.lru_cache(maxsize=1024)
+def _match_pattern(pattern):
+    """Return the fedocal classes matching an AMQP-style topic pattern."""
+    found = []
+    _walk(_get_trie(), pattern.split("."), 0, found)
+    return tuple(found)
+
+
+def match_topics(topics):
+    """
+    Return the fedocal message classes matching topics or topic patterns.
+
+    Patterns follow the AMQP conventions: ``*`` matches exactly one word and
+    ``#`` matches zero or more words. Each pattern is resolved against the
+    registry once and remembered until :func:`refresh_registry` is called.
+
+    Args:
+        topics (iterable): Topics and/or topic patterns.
+
+    Returns:
+        list: The matching :class:`FedocalMessage` sub-classes, without duplicates,
+            in the order they were first matched.
+    """
+    registry = get_registry()
+    output = []
+    seen = set()
+    for topic in topics:
+        if "*" in topic or "#" in topic:
+            matches = _match_pattern(topic)
+        else:
+            cls = registry.get(topic)
+            if cls is None or not issubclass(cls, FedocalMessage):
+                continue
+            matches = (cls,)
+        for cls in matches:
+            if cls not in seen:
+                seen.add(cls)
+                output.append(cls)
+    return output
@@ -0,0 +1,327 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Replay of fedocal messages through a consumer callback, without a broker.
+
+Measure how fast a callback handles synthetic traffic with
+``python -m fedocal_messages.replay -n 100000``, or an archive with
+``--archive traffic.json``.
+"""
+
+import argparse
+import collections
+import json
+import math
+import sys
+import time
+import tracemalloc
+
+from fedora_messaging import message
+from fedora_messaging.exceptions import ValidationError
+
+import jsonschema
+
+from . import get_message_object_from_topic, validation
+from .archive import read_archive
+from .synthetic import TrafficGenerator
+
+
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+
+class InMemoryQueue:
+    """
+    A stand-in for a broker queue, holding messages as the broker delivers them.
+
+    Deliveries are ``(routing_key, properties, body)`` tuples, the body being the
+    encoded JSON payload.
+
+    Args:
+        deliveries (iterable): The deliveries initially in the queue.
+    """
+
+    def __init__(self, deliveries=()):
+        self._deliveries = collections.deque(deliveries)
+
+    def __len__(self):
+        return len(self._deliveries)
+
+    def __iter__(self):
+        return iter(self._deliveries)
+
+    def publish(self, msg):
+        """Encode a message as it is sent to the broker and add it to the queue."""
+        self._deliveries.append((msg.topic, msg._properties, msg._encoded_body))
+
+    def consume(self, on_delivery):
+        """
+        Remove the deliveries from the queue, in order, and handle them.
+
+        Args:
+            on_delivery (callable): Called with the routing key, the properties and
+                the body of each delivery.
+        """
+        deliveries = self._deliveries
+        while deliveries:
+            on_delivery(*deliveries.popleft())
+
+
+def receive(routing_key, properties, body):
+    """
+    Build and validate the message of a delivery, as a consumer does.
+
+    Args:
+        routing_key (str): The topic of the message.
+        properties (pika.BasicProperties): The AMQP properties.
+        body (bytes): The encoded message body.
+
+    Returns:
+        fedora_messaging.message.Message: The message.
+
+    Raises:
+        fedora_messaging.exceptions.ValidationError: If the body cannot be decoded,
+            or the message is invalid.
+    """
+    cls = get_message_object_from_topic(routing_key)
+    if properties.headers is None:
+        properties.headers = {}
+    headers = properties.headers
+    try:
+        decoded = json.loads(body.decode(properties.content_encoding or "utf-8"))
+    except ValueError as e:
+        raise ValidationError(e)
+    msg = cls(
+        body=decoded,
+        topic=routing_key,
+        properties=properties,
+        severity=headers.get("fedora_messaging_severity", message.INFO),
+    )
+    try:
+        msg.validate()
+    except jsonschema.ValidationError as e:
+        raise ValidationError(e)
+    return msg
+
+
+def render(msg):
+    """Render a message the way notifications do, as its summary and its text."""
+    return msg.summary, str(msg)
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of sorted values, or 0.0 if empty."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def _stats(latencies, failed, allocated, retained):
+    """Summarize the measures of a set of messages."""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    busy = sum(latencies)
+    stats = {
+        "messages": count,
+        "failed": failed,
+        "throughput": count / busy if busy else 0.0,
+    }
+    for name, fraction in PERCENTILES:
+        stats[name] = percentile(latencies, fraction)
+    stats["allocated"] = allocated / count if count else 0.0
+    stats["retained"] = retained / count if count else 0.0
+    return stats
+
+
+class Replay:
+    """
+    Measure how a consumer callback handles messages.
+
+    Messages are encoded and put in an :class:`InMemoryQueue`, then consumed:
+    each delivery is decoded, its class looked up with
+    :func:`fedocal_messages.get_message_object_from_topic`, the message built and
+    validated, and the callback called with it.
+
+    Deliveries are consumed twice: first to time them, then to trace the memory
+    allocated while handling each of them with :mod:`tracemalloc`, which is too
+    slow to be on while timing.
+
+    Args:
+        callback (callable): Called with each message. Defaults to :func:`render`.
+        allocations (bool): Whether to measure the memory allocations.
+        cache (bool): Whether to use :data:`fedocal_messages.validation.cache`.
+            Disabled by default, so that every message goes through the schemas.
+    """
+
+    def __init__(self, callback=render, allocations=True, cache=False):
+        self.callback = callback
+        self.allocations = allocations
+        self.cache = cache
+
+    def _handle(self, routing_key, properties, body):
+        """Handle a delivery, returning whether it failed."""
+        try:
+            self.callback(receive(routing_key, properties, body))
+        except Exception:
+            return True
+        return False
+
+    def _time(self, deliveries, latencies, failed):
+        clock = time.perf_counter
+        handle = self._handle
+
+        def on_delivery(routing_key, properties, body):
+            start = clock()
+            if handle(routing_key, properties, body):
+                failed[routing_key] += 1
+            latencies[routing_key].append(clock() - start)
+
+        start = clock()
+        InMemoryQueue(deliveries).consume(on_delivery)
+        return clock() - start
+
+    def _trace(self, deliveries, allocated, retained):
+        def on_delivery(routing_key, properties, body):
+            # This also resets the peak, to measure the memory of this message only.
+            tracemalloc.clear_traces()
+            self._handle(routing_key, properties, body)
+            current, peak = tracemalloc.get_traced_memory()
+            allocated[routing_key] += peak
+            retained[routing_key] += current
+
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        try:
+            InMemoryQueue(deliveries).consume(on_delivery)
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+    def run(self, messages):
+        """
+        Publish messages to an in-memory queue and consume them.
+
+        Args:
+            messages (iterable): The messages.
+
+        Returns:
+            dict: The ``total`` stats of all the messages, and the stats of each
+                topic in ``topics``. Stats are dicts with the number of
+                ``messages``, how many ``failed``, the ``throughput`` in messages
+                per second, the ``p50``, ``p90`` and ``p99`` latencies in seconds,
+                and the bytes ``allocated`` at the peak of handling a message and
+                still ``retained`` after, on average. Failures are messages that
+                are invalid or whose callback raised an exception.
+        """
+        published = InMemoryQueue()
+        for msg in messages:
+            published.publish(msg)
+
+        latencies = collections.defaultdict(list)
+        failed = collections.Counter()
+        allocated = collections.Counter()
+        retained = collections.Counter()
+        enabled = validation.cache.enabled
+        validation.cache.enabled = self.cache
+        try:
+            validation.cache.clear()
+            elapsed = self._time(published, latencies, failed)
+            if self.allocations:
+                validation.cache.clear()
+                self._trace(published, allocated, retained)
+        finally:
+            validation.cache.enabled = enabled
+
+        topics = {
+            topic: _stats(
+                latencies[topic], failed[topic], allocated[topic], retained[topic]
+            )
+            for topic in sorted(latencies)
+        }
+        total = _stats(
+            [latency for values in latencies.values() for latency in values],
+            sum(failed.values()),
+            sum(allocated.values()),
+            sum(retained.values()),
+        )
+        # Over the whole run, including the time spent in the queue.
+        total["throughput"] = len(published) / elapsed if elapsed else 0.0
+        return {"total": total, "topics": topics}
+
+
+def format_report(report):
+    """Return the stats of a replay as a table, one line per topic."""
+    header = "{:<28} {:>9} {:>7} {:>9} {:>8} {:>8} {:>8} {:>10} {:>10}".format(
+        "topic",
+        "messages",
+        "failed",
+        "msg/s",
+        "p50 us",
+        "p90 us",
+        "p99 us",
+        "alloc B",
+        "retain B",
+    )
+    lines = [header]
+    rows = list(report["topics"].items()) + [("total", report["total"])]
+    for topic, stats in rows:
+        lines.append(
+            "{:<28} {:>9} {:>7} {:>9.0f} {:>8.1f} {:>8.1f} {:>8.1f} {:>10.0f} "
+            "{:>10.0f}".format(
+                topic,
+                stats["messages"],
+                stats["failed"],
+                stats["throughput"],
+                stats["p50"] * 1e6,
+                stats["p90"] * 1e6,
+                stats["p99"] * 1e6,
+                stats["allocated"],
+                stats["retained"],
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Replay synthetic traffic, or an archive, and print the stats."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archive", help="replay the messages of this archive")
+    parser.add_argument(
+        "--no-allocations",
+        dest="allocations",
+        action="store_false",
+        help="do not measure the memory allocations",
+    )
+    parser.add_argument("--cache", action="store_true", help="use the validation cache")
+    parser.add_argument("-o", "--output", help="write the stats to this JSON file")
+    args = parser.parse_args(argv)
+    if args.archive:
+        messages = read_archive(args.archive)
+    else:
+        messages = TrafficGenerator(seed=args.seed).messages(args.number)
+    report = Replay(allocations=args.allocations, cache=args.cache).run(messages)
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
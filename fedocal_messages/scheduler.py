@@ -0,0 +1,187 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Scheduling of meeting reminders from the messages fedocal publishes."""
+
+import asyncio
+import datetime
+import heapq
+import inspect
+import itertools
+
+from . import timeutils
+from .messages import MeetingDeleteV1, MeetingNewV1, MeetingUpdateV1, ReminderV1
+
+
+class ReminderScheduler:
+    """
+    Decide when to send the reminder of each meeting.
+
+    New and updated meetings get their reminder scheduled ``lead`` before they
+    start, deleted meetings get it cancelled. Reminders are kept in a heap ordered
+    by the time they are due, so scheduling and sending one is ``O(log n)``.
+
+    Cancelled and rescheduled reminders are not looked for in the heap: they are
+    only marked as stale and skipped when they reach its top. The heap is rebuilt
+    without them when they outnumber the scheduled reminders.
+
+    Args:
+        lead (datetime.timedelta): How long before a meeting its reminder is sent.
+        clock (callable): A function returning the current time as a naive UTC
+            datetime. Defaults to :func:`fedocal_messages.timeutils.utcnow`.
+    """
+
+    def __init__(self, lead=datetime.timedelta(hours=24), clock=None):
+        self.lead = lead
+        self.clock = clock
+        # The heap holds (due, sequence, meeting_id) entries. Only the entry whose
+        # sequence is in _scheduled is current, the others are stale.
+        self._heap = []
+        self._scheduled = {}
+        self._stale = 0
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._running = False
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def _now(self):
+        return (self.clock or timeutils.utcnow)()
+
+    def push(self, message):
+        """
+        Schedule, reschedule or cancel a reminder from a meeting message.
+
+        Meetings already started, or whose start cannot be parsed, are not
+        scheduled. Other messages are ignored.
+        """
+        if isinstance(message, (MeetingNewV1, MeetingUpdateV1)):
+            meeting = message.meeting
+            self._cancel(meeting.meeting_id)
+            try:
+                start = meeting.start
+            except (TypeError, ValueError):
+                return
+            if start <= self._now():
+                return
+            sequence = next(self._sequence)
+            body = {
+                "calendar": message.body["calendar"],
+                "meeting": message.body["meeting"],
+            }
+            self._scheduled[meeting.meeting_id] = (sequence, body)
+            heapq.heappush(
+                self._heap, (start - self.lead, sequence, meeting.meeting_id)
+            )
+        elif isinstance(message, MeetingDeleteV1):
+            self._cancel(message.meeting.meeting_id)
+        else:
+            return
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _cancel(self, meeting_id):
+        if self._scheduled.pop(meeting_id, None) is None:
+            return
+        self._stale += 1
+        if self._stale > max(len(self._scheduled), 1024):
+            self._heap = [
+                entry
+                for entry in self._heap
+                if self._scheduled.get(entry[2], (None,))[0] == entry[1]
+            ]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _top(self):
+        """Return the first current heap entry, dropping the stale ones above it."""
+        heap = self._heap
+        while heap:
+            _, sequence, meeting_id = heap[0]
+            if self._scheduled.get(meeting_id, (None,))[0] == sequence:
+                return heap[0]
+            heapq.heappop(heap)
+            self._stale -= 1
+        return None
+
+    def next_due(self):
+        """
+        Return when the next reminder is due.
+
+        Returns:
+            datetime.datetime: The naive UTC time, or ``None`` if nothing is scheduled.
+        """
+        top = self._top()
+        return top[0] if top is not None else None
+
+    def pop_due(self, now=None):
+        """
+        Return the reminders that are due, and forget them.
+
+        Args:
+            now (datetime.datetime): The current naive UTC time. Defaults to the
+                time of the clock.
+
+        Returns:
+            list: The :class:`ReminderV1` messages, in the order they are due.
+        """
+        if now is None:
+            now = self._now()
+        reminders = []
+        while True:
+            top = self._top()
+            if top is None or top[0] > now:
+                return reminders
+            heapq.heappop(self._heap)
+            _, body = self._scheduled.pop(top[2])
+            reminders.append(ReminderV1(body=body))
+
+    async def run(self, publish):
+        """
+        Send the reminders when they are due, until :meth:`stop` is called.
+
+        Messages pushed meanwhile are taken into account right away.
+
+        Args:
+            publish (callable): Called with each due :class:`ReminderV1`. It may be a
+                coroutine function, which is then awaited.
+        """
+        self._wakeup = asyncio.Event()
+        self._running = True
+        try:
+            while self._running:
+                for reminder in self.pop_due():
+                    result = publish(reminder)
+                    if inspect.isawaitable(result):
+                        await result
+                due = self.next_due()
+                timeout = None
+                if due is not None:
+                    timeout = max((due - self._now()).total_seconds(), 0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            self._wakeup = None
+
+    def stop(self):
+        """Make :meth:`run` return."""
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
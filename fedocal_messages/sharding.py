@@ -0,0 +1,194 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Consumption of fedocal messages in worker processes sharded by calendar."""
+
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+
+from fedora_messaging import message
+
+from .archive import message_from_record
+from .registry import find_class
+
+
+# How often, in seconds, to check that the workers are alive while waiting.
+_POLL_INTERVAL = 1.0
+
+
+def calendar_name(body):
+    """Return the name of the calendar of a message body, or ``""``."""
+    calendar = body.get("calendar")
+    if isinstance(calendar, dict):
+        name = calendar.get("calendar_name")
+        if isinstance(name, str):
+            return name
+    return ""
+
+
+def shard_of(name, shards):
+    """Return the shard, between 0 and ``shards - 1``, of a calendar name."""
+    return zlib.crc32(name.encode("utf-8")) % shards
+
+
+def _worker(shard, inbox, results, handler):
+    """Handle the batches of messages of a shard until the ``None`` sentinel."""
+    count = 0
+    failed = 0
+    busy = 0.0
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        start = time.perf_counter()
+        for topic, headers, id_, body in batch:
+            cls = find_class(topic) or message.Message
+            try:
+                if headers is None:
+                    msg = cls(body=body, topic=topic)
+                else:
+                    record = {
+                        "topic": topic,
+                        "headers": headers,
+                        "id": id_,
+                        "body": body,
+                    }
+                    msg = message_from_record(record, cls)
+                handler(msg)
+            except Exception:
+                failed += 1
+        count += len(batch)
+        busy += time.perf_counter() - start
+    results.put({"shard": shard, "messages": count, "failed": failed, "busy": busy})
+
+
+def _put(inbox, item, process):
+    """Put an item on the queue of a worker, waiting while it is full."""
+    while True:
+        try:
+            inbox.put(item, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            if not process.is_alive():
+                raise RuntimeError("worker {} died".format(process.name))
+
+
+def _get_result(results, processes):
+    """Return the next result of the workers, waiting while they are running."""
+    while True:
+        try:
+            return results.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            for process in processes:
+                if process.exitcode:
+                    raise RuntimeError("worker {} died".format(process.name))
+
+
+class ShardedConsumer:
+    """
+    Handle messages in worker processes, one per shard of calendars.
+
+    Each message goes to the shard of its calendar, found by hashing the calendar
+    name, so that the messages about a calendar are handled in order by a single
+    process while different calendars are handled in parallel. Messages without a
+    calendar all go to the same shard.
+
+    Messages are sent to the workers as their topic, headers, id and body, in
+    batches, and are rebuilt there. Each worker has a bounded queue: when a worker
+    falls behind, sending to it blocks until it catches up.
+
+    Args:
+        handler (callable): Called in the workers with each message. It must be
+            picklable, like a module-level function. Its exceptions are counted and
+            the following messages are still handled.
+        shards (int): The number of worker processes. Defaults to the number of CPUs.
+        queue_size (int): The maximum number of batches waiting for each worker.
+        batch_size (int): The maximum number of messages sent to a worker at once.
+        context (str): The :mod:`multiprocessing` start method. Defaults to the
+            platform default.
+    """
+
+    def __init__(
+        self, handler, shards=None, queue_size=16, batch_size=100, context=None
+    ):
+        self.handler = handler
+        self.shards = shards or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.context = context
+
+    def run(self, messages):
+        """
+        Handle messages and wait until the workers are done.
+
+        Args:
+            messages (iterable): Messages, or ``(topic, body)`` pairs, which get
+                new headers and a new id.
+
+        Returns:
+            list: For each shard, a dict with the number of ``messages`` it handled,
+                how many ``failed``, the time it was ``busy`` handling them and its
+                ``throughput`` in messages per second over the whole run.
+
+        Raises:
+            RuntimeError: If a worker process died.
+        """
+        context = multiprocessing.get_context(self.context)
+        inboxes = [context.Queue(self.queue_size) for _ in range(self.shards)]
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=_worker,
+                args=(shard, inboxes[shard], results, self.handler),
+                name="fedocal-shard-{}".format(shard),
+                daemon=True,
+            )
+            for shard in range(self.shards)
+        ]
+        for process in processes:
+            process.start()
+        start = time.perf_counter()
+        stats = None
+        try:
+            batches = [[] for _ in range(self.shards)]
+            for item in messages:
+                if isinstance(item, message.Message):
+                    item = (item.topic, item._headers, item.id, item.body)
+                else:
+                    item = (item[0], None, None, item[1])
+                shard = shard_of(calendar_name(item[3]), self.shards)
+                batch = batches[shard]
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    _put(inboxes[shard], batch, processes[shard])
+                    batches[shard] = []
+            for shard, batch in enumerate(batches):
+                if batch:
+                    _put(inboxes[shard], batch, processes[shard])
+                _put(inboxes[shard], None, processes[shard])
+            stats = [_get_result(results, processes) for _ in processes]
+        finally:
+            for process in processes:
+                if stats is None:
+                    process.terminate()
+                process.join()
+        elapsed = time.perf_counter() - start
+        for stat in stats:
+            stat["throughput"] = stat["messages"] / elapsed if elapsed else 0.0
+        return sorted(stats, key=lambda stat: stat["shard"])
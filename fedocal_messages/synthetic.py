@@ -0,0 +1,404 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Synthetic fedocal traffic, for load and soak testing consumers offline.
+
+Generate an archive, readable with :func:`fedocal_messages.archive.read_archive`,
+with ``python -m fedocal_messages.synthetic -n 1000000 -o traffic.json``.
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import random
+import sys
+import uuid
+
+from fedora_messaging import message
+
+from .archive import message_from_record
+from .messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    CalendarUpdateV1,
+    CalendarUploadV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+)
+
+
+_TEAMS = [
+    "infrastructure",
+    "design",
+    "qa",
+    "council",
+    "fesco",
+    "marketing",
+    "docs",
+    "websites",
+    "ambassadors",
+    "i18n",
+    "kernel",
+    "python",
+    "modularity",
+    "server",
+    "workstation",
+    "iot",
+    "cloud",
+    "releng",
+    "packaging",
+    "mindshare",
+]
+
+_TIMEZONES = ["UTC", "Europe/Paris", "America/New_York", "Asia/Kolkata", "Asia/Tokyo"]
+
+_LOCATIONS = ["fedora-meeting@irc.freenode.net", "fedora-meeting-1@irc.freenode.net"]
+
+
+class _Pool:
+    """Items by key, of which a random key can be picked in constant time."""
+
+    def __init__(self):
+        self._items = {}
+        self._keys = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def add(self, key, item):
+        self._positions[key] = len(self._keys)
+        self._keys.append(key)
+        self._items[key] = item
+
+    def remove(self, key):
+        del self._items[key]
+        position = self._positions.pop(key)
+        last = self._keys.pop()
+        if last != key:
+            self._keys[position] = last
+            self._positions[last] = position
+
+    def choice(self, random_):
+        return random_.choice(self._keys)
+
+
+class TrafficGenerator:
+    """
+    Generate a realistic, reproducible stream of the nine fedocal messages.
+
+    The generator simulates calendars and their meetings. It starts by creating
+    the calendars, then keeps each of them around ``meetings`` meetings that get
+    created, updated, deleted and reminded of. Updates sometimes come in bursts
+    on the same meeting. Calendars are sometimes cleared, which drops all their
+    meetings, or deleted and then created again.
+
+    The same seed and settings always give the same stream.
+
+    Args:
+        seed: The seed of the random generator.
+        calendars (int): The number of calendars.
+        meetings (int): The number of meetings each calendar tends to have.
+        agents (int): The number of users acting on the calendars.
+        burst_probability (float): The probability that a meeting update starts a
+            burst of updates of the same meeting.
+        max_burst (int): The maximum number of updates in a burst.
+        cascade_probability (float): The probability that a message clears or
+            deletes a calendar.
+        reminder_density (float): The fraction of the messages that are reminders.
+        start (datetime.datetime): When the first message is sent, in naive UTC.
+        interval (float): The mean number of seconds between two messages.
+
+    Raises:
+        ValueError: If a number is not positive, or a probability is not between
+            0 and 1.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        calendars=20,
+        meetings=50,
+        agents=200,
+        burst_probability=0.1,
+        max_burst=5,
+        cascade_probability=0.002,
+        reminder_density=0.2,
+        start=datetime.datetime(2020, 1, 1),
+        interval=30.0,
+    ):
+        for name, value in (
+            ("calendars", calendars),
+            ("meetings", meetings),
+            ("agents", agents),
+            ("max_burst", max_burst),
+            ("interval", interval),
+        ):
+            if value <= 0:
+                raise ValueError("{} must be positive, not {}".format(name, value))
+        for name, value in (
+            ("burst_probability", burst_probability),
+            ("cascade_probability", cascade_probability),
+            ("reminder_density", reminder_density),
+        ):
+            if not 0 <= value <= 1:
+                raise ValueError(
+                    "{} must be between 0 and 1, not {}".format(name, value)
+                )
+        self.random = random.Random(seed)
+        self.meetings = meetings
+        self.burst_probability = burst_probability
+        self.max_burst = max_burst
+        self.cascade_probability = cascade_probability
+        self.reminder_density = reminder_density
+        self.interval = interval
+        self.now = start
+        self._agents = ["user{}".format(index) for index in range(agents)]
+        self._names = []
+        for index in range(calendars):
+            name = _TEAMS[index % len(_TEAMS)]
+            if index >= len(_TEAMS):
+                name += "-{}".format(index // len(_TEAMS))
+            self._names.append(name)
+        # The current calendars, and the pool of their meetings.
+        self._calendars = {}
+        self._meetings = {}
+        self._next_meeting_id = 1
+        # The messages to send before choosing new ones, as (class, calendar,
+        # meeting) tuples.
+        self._pending = collections.deque(
+            (CalendarNewV1, name, None) for name in self._names
+        )
+        self._schemas = {}
+
+    def _calendar(self, name):
+        return {
+            "calendar_name": name,
+            "calendar_contact": "{}@lists.fedoraproject.org".format(name),
+            "calendar_description": "Meetings of the {} team".format(name),
+            "calendar_editor_group": None,
+            "calendar_admin_group": self.random.choice([None, name + "-sig"]),
+            "calendar_status": "Enabled",
+        }
+
+    def _meeting(self, calendar_name, meeting_id):
+        random_ = self.random
+        start = self.now.replace(minute=0, second=0, microsecond=0)
+        start += datetime.timedelta(
+            days=random_.randint(0, 60), hours=random_.randint(1, 23)
+        )
+        end = start + datetime.timedelta(minutes=random_.choice([30, 60, 90]))
+        return {
+            "meeting_id": meeting_id,
+            "meeting_name": "{} meeting {}".format(calendar_name, meeting_id),
+            "meeting_manager": random_.sample(
+                self._agents, random_.randint(1, min(3, len(self._agents)))
+            ),
+            "meeting_date": start.strftime("%Y-%m-%d"),
+            "meeting_date_end": end.strftime("%Y-%m-%d"),
+            "meeting_time_start": start.strftime("%H:%M:%S"),
+            "meeting_time_stop": end.strftime("%H:%M:%S"),
+            "meeting_timezone": random_.choice(_TIMEZONES),
+            "meeting_information": random_.choice([None, "Agenda on the wiki"]),
+            "meeting_location": random_.choice(_LOCATIONS),
+            "calendar_name": calendar_name,
+        }
+
+    def _choose(self):
+        """Pick the next message as a (class, calendar, meeting) tuple."""
+        random_ = self.random
+        if self._calendars and random_.random() < self.reminder_density:
+            name = random_.choice(self._names)
+            meetings = self._meetings.get(name)
+            if meetings:
+                return (ReminderV1, name, meetings.choice(random_))
+        # Only reminders come in the middle of a burst, so its meeting still exists.
+        if self._pending:
+            return self._pending.popleft()
+        name = random_.choice(self._names)
+        if name not in self._calendars:
+            # Deleted calendars get created again when next picked.
+            return (CalendarNewV1, name, None)
+        meetings = self._meetings[name]
+
+        if random_.random() < self.cascade_probability:
+            if random_.random() < 0.5:
+                return (CalendarClearV1, name, None)
+            return (CalendarDeleteV1, name, None)
+
+        roll = random_.random()
+        if roll < 0.05:
+            return (random_.choice([CalendarUpdateV1, CalendarUploadV1]), name, None)
+        if not meetings or roll < 0.05 + 0.5 * (1 - len(meetings) / self.meetings):
+            meeting_id = self._next_meeting_id
+            self._next_meeting_id += 1
+            return (MeetingNewV1, name, meeting_id)
+        meeting_id = meetings.choice(random_)
+        if len(meetings) > self.meetings or roll > 0.85:
+            return (MeetingDeleteV1, name, meeting_id)
+        if self.max_burst > 1 and random_.random() < self.burst_probability:
+            burst = random_.randint(1, self.max_burst - 1)
+            self._pending.extend(
+                (MeetingUpdateV1, name, meeting_id) for _ in range(burst)
+            )
+        return (MeetingUpdateV1, name, meeting_id)
+
+    def _apply(self, cls, name, meeting_id):
+        """Update the simulated state and return the body of the message."""
+        if cls is CalendarNewV1:
+            self._calendars[name] = self._calendar(name)
+            self._meetings[name] = _Pool()
+        calendar = self._calendars[name]
+        meetings = self._meetings[name]
+        if cls is CalendarUpdateV1:
+            calendar["calendar_description"] = "Meetings of the {} team ({})".format(
+                name, self.now.year
+            )
+        elif cls is CalendarClearV1:
+            self._meetings[name] = _Pool()
+        elif cls is CalendarDeleteV1:
+            del self._calendars[name]
+            del self._meetings[name]
+        elif cls is MeetingNewV1:
+            meetings.add(meeting_id, self._meeting(name, meeting_id))
+        elif cls is MeetingUpdateV1:
+            meeting = meetings[meeting_id]
+            meeting["meeting_location"] = self.random.choice(_LOCATIONS)
+            meeting["meeting_information"] = "Agenda v{}".format(
+                self.random.randint(1, 99)
+            )
+
+        body = {"calendar": dict(calendar)}
+        if meeting_id is not None:
+            body["meeting"] = dict(meetings[meeting_id])
+            if cls is MeetingDeleteV1:
+                meetings.remove(meeting_id)
+        if cls is not ReminderV1:
+            body["agent"] = self.random.choice(self._agents)
+        return body
+
+    def _schema(self, cls):
+        try:
+            return self._schemas[cls]
+        except KeyError:
+            name = self._schemas[cls] = message.get_name(cls)
+            return name
+
+    def _generate(self, count):
+        """Yield the class and the record of each message."""
+        random_ = self.random
+        for _ in range(count):
+            cls, name, meeting_id = self._choose()
+            body = self._apply(cls, name, meeting_id)
+            self.now += datetime.timedelta(
+                seconds=random_.expovariate(1 / self.interval)
+            )
+            headers = {
+                "fedora_messaging_schema": self._schema(cls),
+                "sent-at": self.now.replace(microsecond=0).isoformat() + "+00:00",
+                "fedora_messaging_severity": cls.severity,
+            }
+            if "agent" in body:
+                headers["fedora_messaging_user_" + body["agent"]] = True
+            record = {
+                "topic": cls.topic,
+                "headers": headers,
+                "id": str(uuid.UUID(int=random_.getrandbits(128), version=4)),
+                "body": body,
+                "queue": None,
+            }
+            yield cls, record
+
+    def records(self, count):
+        """
+        Generate messages as the dicts written to archives, one per line.
+
+        Args:
+            count (int): The number of messages.
+
+        Yields:
+            dict: The ``topic``, ``headers``, ``id``, ``body`` and ``queue`` of each
+                message.
+        """
+        for _, record in self._generate(count):
+            yield record
+
+    def messages(self, count):
+        """
+        Generate message objects.
+
+        Args:
+            count (int): The number of messages.
+
+        Yields:
+            FedocalMessage: The messages.
+        """
+        for cls, record in self._generate(count):
+            yield message_from_record(record, cls)
+
+    def write(self, stream, count):
+        """
+        Write messages to a stream, in the archive format.
+
+        Args:
+            stream: A text stream.
+            count (int): The number of messages.
+        """
+        dumps = json.JSONEncoder(ensure_ascii=False, sort_keys=True).encode
+        stream.writelines(dumps(record) + "\n" for record in self.records(count))
+
+
+def main(argv=None):
+    """Write synthetic traffic to a file, or to the standard output."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--number", type=int, default=100000)
+    parser.add_argument("-o", "--output", help="write to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calendars", type=int, default=20)
+    parser.add_argument("--meetings", type=int, default=50)
+    parser.add_argument("--burst-probability", type=float, default=0.1)
+    parser.add_argument("--cascade-probability", type=float, default=0.002)
+    parser.add_argument("--reminder-density", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    try:
+        generator = TrafficGenerator(
+            seed=args.seed,
+            calendars=args.calendars,
+            meetings=args.meetings,
+            burst_probability=args.burst_probability,
+            cascade_probability=args.cascade_probability,
+            reminder_density=args.reminder_density,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            generator.write(f, args.number)
+    else:
+        generator.write(sys.stdout, args.number)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
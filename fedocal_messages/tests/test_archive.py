@@ -0,0 +1,249 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the archive reader."""
+
+import datetime
+import json
+from unittest import mock
+
+from fedora_messaging import message
+from fedora_messaging.exceptions import ValidationError
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..archive import read_archive
+from ..messages import CalendarNewV1, MeetingNewV1, MeetingUpdateV1, ReminderV1
+
+
+def _body(calendar="test_calendar", **extra):
+    body = {
+        "agent": "dummy",
+        "calendar": dict(DUMMY_CALENDAR, calendar_name=calendar),
+        "meeting": DUMMY_MEETING,
+    }
+    body.update(extra)
+    return body
+
+
+def _record(msg, sent_at):
+    record = {
+        "topic": msg.topic,
+        "headers": dict(msg._headers, **{"sent-at": sent_at}),
+        "id": msg.id,
+        "body": msg.body,
+        "queue": None,
+    }
+    return json.dumps(record, ensure_ascii=False, sort_keys=True)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Write an archive and return its path and the messages it holds."""
+    messages = [
+        (MeetingNewV1(body=_body()), "2020-03-01T10:00:00+00:00"),
+        (CalendarNewV1(body=_body("infra")), "2020-03-02T10:00:00+00:00"),
+        (message.Message(body={"x": 1}, topic="org.example.other"), "2020-03-02"),
+        (MeetingUpdateV1(body=_body("infra")), "2020-03-03T10:00:00+01:00"),
+        (ReminderV1(body=_body("météo")), "2020-03-04T10:00:00+00:00"),
+    ]
+    path = tmp_path / "archive.json"
+    lines = [_record(msg, sent_at) for msg, sent_at in messages]
+    path.write_text("\n".join(lines) + "\n\n", encoding="utf-8")
+    return str(path), [msg for msg, _ in messages]
+
+
+def test_read_all(archive):
+    """Assert every fedocal message is read back, with its headers and id."""
+    path, messages = archive
+    read = list(read_archive(path))
+    expected = [msg for msg in messages if msg.topic.startswith("fedocal.")]
+    assert [type(msg) for msg in read] == [type(msg) for msg in expected]
+    assert [msg.body for msg in read] == [msg.body for msg in expected]
+    assert [msg.id for msg in read] == [msg.id for msg in expected]
+    assert read[0].topic == "fedocal.meeting.new"
+    assert read[0]._headers["sent-at"] == "2020-03-01T10:00:00+00:00"
+    for msg in read:
+        msg.validate()
+
+
+def test_lazy(archive):
+    """Assert lines are only decoded as messages are consumed."""
+    path, _ = archive
+    with mock.patch("fedocal_messages.archive.json.loads", wraps=json.loads) as loads:
+        reader = read_archive(path)
+        next(reader)
+        assert loads.call_count == 1
+
+
+def test_topics(archive):
+    """Assert topics and topic patterns select the messages."""
+    path, _ = archive
+    read = list(read_archive(path, topics=["fedocal.calendar.new"]))
+    assert [type(msg) for msg in read] == [CalendarNewV1]
+    read = list(read_archive(path, topics=["fedocal.meeting.*"]))
+    assert [type(msg) for msg in read] == [MeetingNewV1, MeetingUpdateV1, ReminderV1]
+    assert list(read_archive(path, topics=["org.example.other"])) == []
+
+
+def test_topics_skip_decoding(archive):
+    """Assert lines with other topics are not decoded."""
+    path, _ = archive
+    with mock.patch("fedocal_messages.archive.json.loads", wraps=json.loads) as loads:
+        read = list(read_archive(path, topics=["fedocal.calendar.new"]))
+    assert len(read) == 1
+    assert loads.call_count == 1
+
+
+def test_topic_in_body(tmp_path):
+    """Assert the topic is taken from the envelope when the body has one too."""
+    path = tmp_path / "archive.json"
+    msg = MeetingNewV1(body=_body(topic="fedocal.calendar.new"))
+    path.write_text(_record(msg, "2020-03-01T10:00:00+00:00"))
+    read = list(read_archive(str(path), topics=["fedocal.meeting.new"]))
+    assert [type(msg) for msg in read] == [MeetingNewV1]
+    assert list(read_archive(str(path), topics=["fedocal.calendar.new"])) == []
+
+
+def test_prefixed_topics(tmp_path):
+    """Assert messages consumed from the broker, with prefixed topics, are read."""
+    prefixed = MeetingNewV1(
+        body=_body(), topic="org.fedoraproject.prod.fedocal.meeting.new"
+    )
+    plain = CalendarNewV1(body=_body("infra"))
+    other = message.Message(body={}, topic="org.fedoraproject.prod.bodhi.update")
+    path = tmp_path / "archive.json"
+    path.write_text(message.dumps([prefixed, plain, other]), encoding="utf-8")
+    read = list(read_archive(str(path)))
+    assert [type(msg) for msg in read] == [MeetingNewV1, CalendarNewV1]
+    assert read[0].topic == prefixed.topic
+    assert read[0].id == prefixed.id
+    read = list(read_archive(str(path), topics=["fedocal.meeting.new"]))
+    assert [msg.id for msg in read] == [prefixed.id]
+
+
+def test_calendars(archive):
+    """Assert messages are selected by calendar, including non-ASCII names."""
+    path, _ = archive
+    read = list(read_archive(path, calendars=["infra"]))
+    assert [type(msg) for msg in read] == [CalendarNewV1, MeetingUpdateV1]
+    read = list(read_archive(path, calendars=["météo", "test_calendar"]))
+    assert [type(msg) for msg in read] == [MeetingNewV1, ReminderV1]
+
+
+def test_calendars_exact(tmp_path):
+    """Assert a calendar name found elsewhere in the body does not match."""
+    path = tmp_path / "archive.json"
+    path.write_text(
+        "\n".join(
+            [
+                _record(MeetingNewV1(body=_body(agent="infra")), "2020-03-01"),
+                _record(MeetingNewV1(body={"agent": "infra"}), "2020-03-01"),
+            ]
+        )
+    )
+    assert list(read_archive(str(path), calendars=["infra"])) == []
+
+
+def test_calendars_skip_decoding(archive):
+    """Assert lines not mentioning the calendars are not decoded."""
+    path, _ = archive
+    with mock.patch("fedocal_messages.archive.json.loads", wraps=json.loads) as loads:
+        read = list(read_archive(path, calendars=["météo"]))
+    assert len(read) == 1
+    assert loads.call_count == 1
+
+
+def test_time_range(archive):
+    """Assert messages are selected by the time they were sent at."""
+    path, _ = archive
+    read = list(
+        read_archive(
+            path,
+            since=datetime.datetime(2020, 3, 2),
+            until=datetime.datetime(2020, 3, 4, 10, tzinfo=datetime.timezone.utc),
+        )
+    )
+    assert [type(msg) for msg in read] == [CalendarNewV1, MeetingUpdateV1]
+    read = list(read_archive(path, until=datetime.datetime(2020, 3, 3, 9)))
+    assert [type(msg) for msg in read] == [MeetingNewV1, CalendarNewV1]
+
+
+def test_time_range_skip_decoding(archive):
+    """Assert lines sent out of the time range are not decoded."""
+    path, _ = archive
+    with mock.patch("fedocal_messages.archive.json.loads", wraps=json.loads) as loads:
+        read = list(read_archive(path, since=datetime.datetime(2020, 3, 4)))
+    assert len(read) == 1
+    assert loads.call_count == 1
+
+
+def test_time_range_unknown(tmp_path):
+    """Assert messages without a valid sent-at are outside of any time range."""
+    path = tmp_path / "archive.json"
+    msg = MeetingNewV1(body=_body(**{"sent-at": "2020-03-01"}))
+    path.write_text(
+        "\n".join(
+            [_record(msg, "2020-03-01T10:00:00Z"), _record(msg, "yesterday")]
+            + [_record(msg, None)]
+        )
+    )
+    since = datetime.datetime(2020, 1, 1)
+    read = list(read_archive(str(path), since=since))
+    assert len(read) == 1
+    assert list(read_archive(str(path))) != []
+
+
+def test_empty(tmp_path):
+    """Assert empty archives have no messages."""
+    path = tmp_path / "archive.json"
+    path.write_text("")
+    assert list(read_archive(str(path))) == []
+
+
+def test_no_trailing_newline(tmp_path):
+    """Assert the last line is read when the file does not end with a newline."""
+    path = tmp_path / "archive.json"
+    path.write_text(_record(MeetingNewV1(body=_body()), "2020-03-01"))
+    assert len(list(read_archive(str(path)))) == 1
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "not json",
+        "[]",
+        '{"topic": "fedocal.meeting.new", "body": {}}',
+        '{"topic": "fedocal.meeting.new", "body": {}, "headers": []}',
+        '{"topic": [], "body": {}, "headers": {}}',
+    ],
+)
+def test_invalid_line(tmp_path, line):
+    """Assert decoded lines that are not serialized messages are reported."""
+    path = tmp_path / "archive.json"
+    path.write_text(_record(MeetingNewV1(body=_body()), "2020-03-01") + "\n" + line)
+    reader = read_archive(str(path))
+    next(reader)
+    with pytest.raises(ValidationError, match="line 2"):
+        next(reader)
+
+
+def test_invalid_line_skipped(tmp_path):
+    """Assert lines skipped before being decoded are not checked."""
+    path = tmp_path / "archive.json"
+    path.write_text('{"topic": "org.example.other", "body": ')
+    assert list(read_archive(str(path))) == []
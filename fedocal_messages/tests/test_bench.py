@@ -0,0 +1,158 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the benchmarks."""
+
+import json
+
+import pytest
+
+from .. import bench
+from ..messages import MeetingNewV1
+
+
+def test_sample_body():
+    """Assert the benchmarks run on a valid message."""
+    MeetingNewV1(body=bench.SAMPLE_BODY).validate()
+
+
+def test_bench_validate():
+    """Assert the validation benchmark reports both variants."""
+    results = bench.bench_validate(number=1)
+    assert set(results) == {"jsonschema", "compiled", "fast", "result_cache", "speedup"}
+
+
+def test_bench_validate_many():
+    """Assert the bulk validation benchmark reports both variants."""
+    results = bench.bench_validate_many(number=2)
+    assert set(results) == {"serial", "workers", "speedup"}
+
+
+def test_bench_reminder_strings():
+    """Assert the reminder strings benchmark reports both variants."""
+    results = bench.bench_reminder_strings(number=2)
+    assert set(results) == {"scalar", "batch", "speedup"}
+
+
+def test_bench_parse_datetime():
+    """Assert the datetime parsing benchmark reports every variant."""
+    results = bench.bench_parse_datetime(number=2)
+    assert set(results) == {"strptime", "sliced", "cached", "speedup"}
+
+
+def test_bench_meeting_times():
+    """Assert the meeting times benchmark reports every variant."""
+    results = bench.bench_meeting_times(number=2)
+    assert set(results) == {"naive", "local", "uncached_conversion", "overhead"}
+
+
+def test_bench_coalesce():
+    """Assert coalescing updates is timed."""
+    results = bench.bench_coalesce(number=20)
+    assert set(results) == {"updates"}
+    assert results["updates"] > 0
+
+
+def test_bench_scheduler():
+    """Assert scheduling and sending reminders is timed."""
+    results = bench.bench_scheduler(number=20)
+    assert set(results) == {"push", "pop_due"}
+    assert all(value > 0 for value in results.values())
+
+
+def test_bench_synthetic():
+    """Assert generating records and archive lines is timed."""
+    results = bench.bench_synthetic(number=20)
+    assert set(results) == {"records", "write"}
+    assert all(value > 0 for value in results.values())
+
+
+def test_sample_bodies():
+    """Assert the sample body of every class is valid."""
+    for cls in bench.MESSAGE_CLASSES:
+        cls(body=bench.sample_body(cls)).validate()
+
+
+def test_bench_messages():
+    """Assert every operation of every class is timed."""
+    results = bench.bench_messages(number=1)
+    assert len(bench.MESSAGE_CLASSES) == 9
+    assert len(results) == 9 * 6
+    assert "ReminderV1.get_message_object_from_topic" in results
+    assert "MeetingNewV1.validate" in results
+
+
+def test_bench_import():
+    """Assert the import time is measured."""
+    results = bench.bench_import()
+    assert 0 < results["fedocal_messages"] < 60
+
+
+def test_find_regressions():
+    """Assert timings slower than their threshold are reported."""
+    baseline = {"a.x": 1.0, "a.y": 1.0, "b.x": 1.0, "b.speedup": 10.0}
+    results = {"a.x": 1.2, "a.y": 1.6, "b.x": 1.6, "b.speedup": 1.0, "c.x": 9.0}
+    thresholds = [("*", 0.25), ("b.*", 1.0)]
+    assert bench.find_regressions(results, baseline, thresholds) == [("a.y", 1.0, 1.6)]
+    assert bench.find_regressions(results, baseline, []) == [
+        ("a.x", 1.0, 1.2),
+        ("a.y", 1.0, 1.6),
+        ("b.x", 1.0, 1.6),
+    ]
+
+
+def test_main_output_and_compare(tmpdir, capsys):
+    """Assert results can be saved and compared with a later run."""
+    output = tmpdir.join("results.json")
+    assert bench.main(["-n", "1", "-o", str(output), "parse_datetime"]) == 0
+    saved = json.loads(output.read())
+    assert set(saved["results"]) == {
+        "parse_datetime.strptime",
+        "parse_datetime.sliced",
+        "parse_datetime.cached",
+        "parse_datetime.speedup",
+    }
+    args = ["-n", "1", "-c", str(output), "-t", "1000", "parse_datetime"]
+    assert bench.main(args) == 0
+
+    saved["results"]["parse_datetime.strptime"] = 1e-12
+    output.write(json.dumps(saved))
+    capsys.readouterr()
+    assert bench.main(["-n", "1", "-c", str(output), "parse_datetime"]) == 1
+    assert "REGRESSION parse_datetime.strptime" in capsys.readouterr().out
+    args = ["-n", "1", "-c", str(output), "-t", "1000"]
+    args += ["-t", "parse_datetime.strptime=1e20"]
+    assert bench.main(args + ["parse_datetime"]) == 0
+
+
+def test_main_invalid_threshold():
+    """Assert invalid thresholds are refused."""
+    with pytest.raises(SystemExit):
+        bench.main(["-t", "wat", "validate"])
+
+
+def test_main(capsys):
+    """Assert the benchmarks can be run from the command line."""
+    assert bench.main(["-n", "1", "validate"]) == 0
+    out = capsys.readouterr().out
+    assert "validate: compiled" in out
+    assert "validate: speedup" in out
+
+
+def test_main_unknown(capsys):
+    """Assert unknown benchmarks are refused."""
+    with pytest.raises(SystemExit):
+        bench.main(["wat"])
@@ -0,0 +1,173 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the coalescing of meeting updates."""
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..coalesce import UpdateCoalescer, coalesce
+from ..index import MeetingIndex
+from ..messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+)
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _message(cls, meeting_id, name="wat", calendar=DUMMY_CALENDAR["calendar_name"]):
+    calendar = dict(DUMMY_CALENDAR, calendar_name=calendar)
+    meeting = dict(
+        DUMMY_MEETING,
+        meeting_id=meeting_id,
+        meeting_name=name,
+        calendar_name=calendar["calendar_name"],
+    )
+    return cls(body={"agent": "dummy", "calendar": calendar, "meeting": meeting})
+
+
+def test_updates_collapsed():
+    """Assert updates of a meeting within the window are collapsed to the latest."""
+    clock = FakeClock()
+    coalescer = UpdateCoalescer(window=5, clock=clock)
+    first = _message(MeetingUpdateV1, 1, "first")
+    latest = _message(MeetingUpdateV1, 1, "latest")
+    other = _message(MeetingUpdateV1, 2)
+    assert coalescer.push(first) == []
+    clock.now = 1
+    assert coalescer.push(other) == []
+    clock.now = 4
+    assert coalescer.push(latest) == []
+    assert len(coalescer) == 2
+    clock.now = 5
+    assert coalescer.poll() == [latest]
+    clock.now = 6
+    assert coalescer.poll() == [other]
+    assert coalescer.coalesced == 1
+    assert len(coalescer) == 0
+
+
+def test_new_window_after_release():
+    """Assert an update after the window starts a new one."""
+    clock = FakeClock()
+    coalescer = UpdateCoalescer(window=5, clock=clock)
+    first = _message(MeetingUpdateV1, 1, "first")
+    second = _message(MeetingUpdateV1, 1, "second")
+    coalescer.push(first)
+    clock.now = 10
+    assert coalescer.push(second) == [first]
+    assert coalescer.flush() == [second]
+
+
+def test_delete_cancels_updates():
+    """Assert a delete cancels the held update of its meeting."""
+    coalescer = UpdateCoalescer(window=5, clock=FakeClock())
+    update = _message(MeetingUpdateV1, 1)
+    delete = _message(MeetingDeleteV1, 1)
+    other_delete = _message(MeetingDeleteV1, 2)
+    coalescer.push(update)
+    assert coalescer.push(delete) == [delete]
+    assert coalescer.push(other_delete) == [other_delete]
+    assert coalescer.cancelled == 1
+    assert coalescer.flush() == []
+
+
+def test_calendar_cascades_cancel_updates():
+    """Assert a calendar clear or delete cancels the held updates of its meetings."""
+    for cls in (CalendarClearV1, CalendarDeleteV1):
+        coalescer = UpdateCoalescer(window=5, clock=FakeClock())
+        updates = [_message(MeetingUpdateV1, meeting_id) for meeting_id in (1, 2)]
+        other = _message(MeetingUpdateV1, 3, calendar="other")
+        cascade = cls(body={"agent": "dummy", "calendar": DUMMY_CALENDAR})
+        for update in updates + [other]:
+            coalescer.push(update)
+        assert coalescer.push(cascade) == [cascade]
+        assert coalescer.cancelled == 2
+        assert coalescer.flush() == [other]
+
+
+def test_calendar_delete_stream():
+    """Assert no update comes after the delete of its calendar."""
+    new = _message(MeetingNewV1, 1)
+    update = _message(MeetingUpdateV1, 1)
+    delete = CalendarDeleteV1(body={"agent": "dummy", "calendar": DUMMY_CALENDAR})
+    output = list(coalesce([new, update, delete], window=60))
+    assert output == [new, delete]
+    index = MeetingIndex()
+    index.apply_many(output)
+    assert len(index) == 0
+
+
+def test_other_messages_pass_through():
+    """Assert messages other than updates are not held."""
+    coalescer = UpdateCoalescer(window=5, clock=FakeClock())
+    new = _message(MeetingNewV1, 1)
+    calendar = CalendarNewV1(body={"agent": "dummy", "calendar": DUMMY_CALENDAR})
+    assert coalescer.push(new) == [new]
+    assert coalescer.push(calendar) == [calendar]
+
+
+def test_bounded():
+    """Assert the oldest held update is released when too many are held."""
+    coalescer = UpdateCoalescer(window=5, max_pending=2, clock=FakeClock())
+    updates = [_message(MeetingUpdateV1, meeting_id) for meeting_id in range(3)]
+    assert coalescer.push(updates[0]) == []
+    assert coalescer.push(updates[1]) == []
+    assert coalescer.push(updates[2]) == [updates[0]]
+    assert len(coalescer) == 2
+
+
+def test_coalesce_stream():
+    """Assert a stream is coalesced and the held updates released at its end."""
+    updates = [_message(MeetingUpdateV1, 1, str(index)) for index in range(5)]
+    new = _message(MeetingNewV1, 2)
+    output = list(coalesce(updates + [new], window=60))
+    assert output == [new, updates[-1]]
+
+
+def test_large_burst():
+    """Assert large bursts are coalesced in bounded memory."""
+    clock = FakeClock()
+    update_body = {
+        "agent": "dummy",
+        "calendar": DUMMY_CALENDAR,
+        "meeting": DUMMY_MEETING,
+    }
+    messages = []
+    for index in range(20000):
+        meeting = dict(DUMMY_MEETING, meeting_id=index % 50)
+        msg = MeetingUpdateV1(body=dict(update_body, meeting=meeting))
+        messages.append(msg)
+    coalescer = UpdateCoalescer(window=1, max_pending=100, clock=clock)
+    released = 0
+    for index, msg in enumerate(messages):
+        clock.now = index / 1000
+        released += len(coalescer.push(msg))
+        assert len(coalescer) <= 100
+    released += len(coalescer.flush())
+    assert released < len(messages)
+    assert released + coalescer.coalesced == len(messages)
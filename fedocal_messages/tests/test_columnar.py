@@ -0,0 +1,156 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the columnar export."""
+
+import datetime
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..messages import CalendarNewV1, MeetingNewV1, MeetingUpdateV1
+
+
+numpy = pytest.importorskip("numpy")
+columnar = pytest.importorskip("fedocal_messages.columnar")
+
+
+def _messages():
+    meeting = dict(DUMMY_MEETING, meeting_id=7, meeting_manager=["ralph", None])
+    messages = [
+        MeetingNewV1(
+            body={"agent": "ralph", "calendar": DUMMY_CALENDAR, "meeting": meeting}
+        ),
+        CalendarNewV1(body={"agent": "pingou", "calendar": DUMMY_CALENDAR}),
+        MeetingUpdateV1(
+            body={
+                "agent": "ralph",
+                "calendar": dict(DUMMY_CALENDAR, calendar_name="other"),
+                "meeting": dict(
+                    DUMMY_MEETING,
+                    meeting_date="2013-02-30",
+                    meeting_time_stop="25:00:00",
+                    meeting_name=None,
+                    meeting_id=True,
+                ),
+            }
+        ),
+    ]
+    for msg in messages:
+        msg._headers["sent-at"] = "2013-09-19T10:00:00+02:00"
+    messages[2]._headers["sent-at"] = "never"
+    return messages
+
+
+def test_columns():
+    """Assert there is one column per schema field."""
+    names = [column for column, _, _, _ in columnar.COLUMNS]
+    assert len(names) == len(set(names))
+    assert "meeting_calendar_name" in names
+    fields = {(source, field) for _, source, field, _ in columnar.COLUMNS}
+    for name in DUMMY_CALENDAR:
+        assert ("calendar", name) in fields
+    for name in set(DUMMY_MEETING) - {"meeting_region"}:
+        assert ("meeting", name) in fields
+
+
+def test_dictionary():
+    """Assert values get stable codes and missing values are -1."""
+    dictionary = columnar.Dictionary()
+    assert [dictionary.encode(v) for v in ["a", "b", None, "a"]] == [0, 1, -1, 0]
+    assert len(dictionary) == 2
+    assert dictionary.decode([1, -1, 0]) == ["b", None, "a"]
+
+
+def test_to_numpy():
+    """Assert messages are exported into typed columns."""
+    exporter = columnar.ColumnarExporter()
+    array = exporter.to_numpy(_messages())
+    assert len(array) == 3
+
+    def strings(column):
+        return exporter.dictionaries[column].decode(array[column])
+
+    assert strings("topic") == [
+        "fedocal.meeting.new",
+        "fedocal.calendar.new",
+        "fedocal.meeting.update",
+    ]
+    assert strings("agent") == ["ralph", "pingou", "ralph"]
+    assert strings("calendar_name") == ["test_calendar", "test_calendar", "other"]
+    assert strings("calendar_editor_group") == [None, None, None]
+    assert strings("meeting_name") == ["wat", None, None]
+    assert strings("meeting_manager") == [("ralph", None), None, ("ralph",)]
+    assert strings("meeting_calendar_name") == ["awesome", None, "awesome"]
+    assert array["sent_at"][0] == numpy.datetime64("2013-09-19T08:00:00")
+    assert numpy.isnat(array["sent_at"][2])
+    assert array["meeting_id"][0] == 7
+    assert numpy.isnan(array["meeting_id"][1:]).all()
+    assert array["meeting_date"][0] == numpy.datetime64("2013-09-20")
+    assert array["meeting_time_start"][0] == numpy.timedelta64(12 * 3600, "s")
+    assert array["meeting_start"][0] == numpy.datetime64("2013-09-20T12:00:00")
+    assert numpy.isnat(array["meeting_start"][1:]).all()
+    assert array["meeting_date_end"][2] == numpy.datetime64("2013-09-21")
+    assert numpy.isnat(array["meeting_time_stop"][2])
+
+
+def test_chunks():
+    """Assert chunks are bounded and share their dictionaries."""
+    exporter = columnar.ColumnarExporter(chunksize=2)
+    chunks = list(exporter.chunks(_messages() * 2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 2]
+    assert list(chunks[0]["topic"]) == list(chunks[1]["topic"][1:]) + [1]
+    assert len(exporter.dictionaries["topic"]) == 3
+    array = exporter.to_numpy(_messages() * 2)
+    assert numpy.concatenate(chunks).tobytes() == array.tobytes()
+
+
+def test_to_numpy_empty():
+    """Assert exporting no messages gives an empty array."""
+    exporter = columnar.ColumnarExporter()
+    array = exporter.to_numpy([])
+    assert len(array) == 0
+    assert array.dtype == exporter.dtype
+
+
+def test_to_arrow():
+    """Assert messages are exported into an Arrow table."""
+    pyarrow = pytest.importorskip("pyarrow")
+    exporter = columnar.ColumnarExporter(chunksize=2)
+    table = exporter.to_arrow(_messages())
+    assert table.num_rows == 3
+    assert table.column("topic").num_chunks == 2
+    assert pyarrow.types.is_dictionary(table.schema.field("topic").type)
+    rows = table.to_pylist()
+    assert rows[0]["topic"] == "fedocal.meeting.new"
+    assert rows[0]["sent_at"] == datetime.datetime(2013, 9, 19, 8)
+    assert rows[0]["meeting_id"] == 7
+    assert rows[0]["meeting_manager"] == ["ralph", None]
+    assert rows[0]["meeting_date"] == datetime.date(2013, 9, 20)
+    assert rows[0]["meeting_time_start"] == datetime.timedelta(hours=12)
+    assert rows[0]["meeting_start"] == datetime.datetime(2013, 9, 20, 12)
+    assert rows[1]["meeting_id"] is None
+    assert rows[1]["meeting_name"] is None
+    assert rows[1]["meeting_manager"] is None
+    assert rows[1]["meeting_start"] is None
+
+
+def test_to_arrow_empty():
+    """Assert exporting no messages gives an empty table with all the columns."""
+    pytest.importorskip("pyarrow")
+    table = columnar.ColumnarExporter().to_arrow([])
+    assert table.num_rows == 0
+    assert table.column_names == [column for column, _, _, _ in columnar.COLUMNS]
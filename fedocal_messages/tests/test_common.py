@@ -16,8 +16,19 @@
 
 """Unit tests for common properties of the message schemas."""
 
+import datetime
+import json
+from unittest import mock
+
+from fedora_messaging.exceptions import ValidationError
+
+import pika
+
+import pytest
+
 from .utils import DUMMY_CALENDAR, DUMMY_MEETING
-from ..messages import ReminderV1
+from ..base import Calendar, Meeting, avatar_url
+from ..messages import CalendarNewV1, MeetingNewV1, ReminderV1
 
 
 def test_properties():
@@ -33,3 +44,152 @@ def test_properties():
         "b0ec8f140ba7eee8f4bfc7955858bc43c14fdd83edadf7b3819459efcaa5c690?s=64&d=retro"
     )
     assert message.usernames == ["dummy_user"]
+
+
+def _raw_body():
+    body = {"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR, "agent": "dummy_user"}
+    return json.dumps(body).encode("utf-8")
+
+
+def test_from_raw_lazy():
+    """Assert the body is only decoded when it is accessed."""
+    properties = pika.BasicProperties(headers={})
+    with mock.patch("fedocal_messages.base.json.loads", wraps=json.loads) as loads:
+        message = ReminderV1.from_raw(_raw_body(), properties=properties)
+        assert message.topic == "fedocal.meeting.reminder"
+        assert message._encoded_body == _raw_body()
+        assert loads.call_count == 0
+        assert message.agent == "dummy_user"
+        assert message.body["meeting"]["meeting_name"] == "wat"
+        assert loads.call_count == 1
+    assert message._encoded_body == _raw_body()
+    message.validate()
+
+
+def test_from_raw_properties():
+    """Assert the properties are required and used as they are."""
+    with pytest.raises(TypeError):
+        ReminderV1.from_raw(_raw_body())
+    properties = ReminderV1(body=json.loads(_raw_body().decode("utf-8")))._properties
+    with mock.patch.object(ReminderV1, "_build_properties") as build_properties:
+        message = ReminderV1.from_raw(
+            _raw_body(), properties, topic="prefix.fedocal.meeting.reminder"
+        )
+    build_properties.assert_not_called()
+    assert message.topic == "prefix.fedocal.meeting.reminder"
+    assert message._properties is properties
+    assert message._headers["fedora_messaging_user_dummy_user"] is True
+    message.validate()
+
+
+def test_from_raw_encoding():
+    """Assert payloads in other encodings are decoded and re-encoded."""
+    body = {"calendar": DUMMY_CALENDAR, "agent": "dummy_usér"}
+    payload = json.dumps(body, ensure_ascii=False).encode("latin-1")
+    properties = pika.BasicProperties(headers={})
+    message = CalendarNewV1.from_raw(payload, properties=properties, encoding="latin-1")
+    assert message._encoded_body == json.dumps(body).encode("utf-8")
+    assert message.agent == "dummy_usér"
+
+
+def test_from_raw_invalid():
+    """Assert undecodable payloads raise a validation error when accessed."""
+    properties = pika.BasicProperties(headers={})
+    message = ReminderV1.from_raw(b"{not json", properties=properties)
+    with pytest.raises(ValidationError):
+        message.body
+    message = ReminderV1.from_raw(b"\xff", properties=properties)
+    with pytest.raises(ValidationError):
+        message.agent
+    message = ReminderV1.from_raw(b"{not json", properties=properties)
+    with pytest.raises(ValidationError):
+        message.validate()
+
+
+def test_body_setter():
+    """Assert setting the body replaces the raw payload."""
+    properties = pika.BasicProperties(headers={})
+    message = ReminderV1.from_raw(b"{not json", properties=properties)
+    message.body = {"agent": "someone"}
+    assert message.agent == "someone"
+
+
+def test_calendar_view():
+    """Assert the calendar is exposed as a typed view."""
+    message = CalendarNewV1(body={"calendar": DUMMY_CALENDAR, "agent": "dummy_user"})
+    calendar = message.calendar
+    assert isinstance(calendar, Calendar)
+    assert calendar.calendar_name == "test_calendar"
+    assert calendar.calendar_editor_group is None
+    assert calendar.calendar_status == "active"
+    assert repr(calendar) == "Calendar(calendar_name='test_calendar')"
+    assert message.calendar is calendar
+    assert not hasattr(calendar, "__dict__")
+    assert message.meeting is None
+
+
+def test_meeting_view():
+    """Assert the meeting is exposed as a typed view with parsed datetimes."""
+    message = MeetingNewV1(
+        body={"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR, "agent": "dummy"}
+    )
+    meeting = message.meeting
+    assert isinstance(meeting, Meeting)
+    assert meeting.meeting_id == 42
+    assert meeting.meeting_manager == ["ralph"]
+    assert meeting.start == datetime.datetime(2013, 9, 20, 12, 0, 0)
+    assert meeting.end == datetime.datetime(2013, 9, 21, 12, 0, 0)
+    assert meeting.start is meeting.start
+    assert meeting.end is meeting.end
+    assert repr(meeting) == "Meeting(meeting_id=42, meeting_name='wat')"
+    assert message.meeting is meeting
+    assert not hasattr(meeting, "__dict__")
+
+
+def test_views_reset_with_body():
+    """Assert the views follow the body when it is replaced."""
+    message = ReminderV1(body={"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR})
+    assert message.meeting.meeting_name == "wat"
+    meeting = DUMMY_MEETING.copy()
+    meeting["meeting_name"] = "other"
+    message.body = {"meeting": meeting, "calendar": {}}
+    assert message.meeting.meeting_name == "other"
+    assert message.calendar.calendar_name is None
+
+
+def test_memoized_properties():
+    """Assert the avatar, usernames and URL are only computed once."""
+    body = {"calendar": DUMMY_CALENDAR, "agent": "memoized_user", "thing": {"url": "u"}}
+    message = CalendarNewV1(body=body)
+    with mock.patch("fedocal_messages.base.avatar_url") as avatar:
+        assert message.agent_avatar is message.agent_avatar
+        assert avatar.call_count == 1
+    assert message.usernames is message.usernames
+    assert message.url == "u"
+    message.body = {"calendar": DUMMY_CALENDAR, "agent": "other_user"}
+    assert message.usernames == ["other_user"]
+    assert message.url is None
+
+
+def test_avatar_url_cache():
+    """Assert avatar URLs are shared between messages."""
+    avatar_url.cache_clear()
+    body = {"calendar": DUMMY_CALENDAR, "agent": "dummy_user"}
+    with mock.patch(
+        "fedocal_messages.base.user_avatar_url", return_value="https://avatar"
+    ) as user_avatar_url:
+        for _ in range(3):
+            assert CalendarNewV1(body=body).agent_avatar == "https://avatar"
+    assert user_avatar_url.call_count == 1
+    info = avatar_url.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+    avatar_url.cache_clear()
+
+
+def test_str_cached():
+    """Assert the text is rendered once, until the body is replaced."""
+    message = CalendarNewV1(body={"calendar": DUMMY_CALENDAR, "agent": "dummy_user"})
+    assert str(message) is str(message)
+    assert message.summary is str(message)
+    message.body = {"calendar": DUMMY_CALENDAR, "agent": "other_user"}
+    assert str(message) == "other_user has created a new calendar test_calendar"
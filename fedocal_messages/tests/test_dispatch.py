@@ -0,0 +1,274 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the message dispatcher."""
+
+import asyncio
+
+from fedora_messaging import message
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..base import FedocalMessage
+from ..dispatch import Dispatcher
+from ..messages import CalendarNewV1, MeetingNewV1, MeetingUpdateV1
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def _body(calendar="infra", meeting_id=1):
+    return {
+        "agent": "dummy",
+        "calendar": dict(DUMMY_CALENDAR, calendar_name=calendar),
+        "meeting": dict(DUMMY_MEETING, meeting_id=meeting_id),
+    }
+
+
+def test_register():
+    """Assert handlers are found through the class hierarchy, in order."""
+    dispatcher = Dispatcher()
+
+    @dispatcher.register(FedocalMessage)
+    def everything(msg):
+        pass
+
+    def new(msg):
+        pass
+
+    assert dispatcher.register(MeetingNewV1, new) is new
+    assert dispatcher.handlers(MeetingNewV1) == [everything, new]
+    assert dispatcher.handlers(CalendarNewV1) == [everything]
+    assert dispatcher.handlers(message.Message) == []
+    dispatcher.register(CalendarNewV1, new)
+    assert dispatcher.handlers(CalendarNewV1) == [everything, new]
+
+
+def test_dispatch():
+    """Assert messages and (topic, body) pairs go to their handlers."""
+    dispatcher = Dispatcher()
+    seen = []
+
+    @dispatcher.register(MeetingNewV1)
+    async def new(msg):
+        seen.append(("async", msg))
+
+    @dispatcher.register(MeetingNewV1)
+    def new_sync(msg):
+        seen.append(("sync", msg))
+
+    msg = MeetingNewV1(body=_body())
+    source = [
+        msg,
+        ("fedocal.meeting.new", _body(meeting_id=2)),
+        ("fedocal.meeting.update", _body()),
+        ("org.example.other", {}),
+        ("fedocal.unknown", {}),
+    ]
+    _run(dispatcher.run(source))
+    assert [kind for kind, _ in seen] == ["async", "sync", "async", "sync"]
+    assert seen[0][1] is msg
+    assert isinstance(seen[2][1], MeetingNewV1)
+    assert seen[2][1].meeting.meeting_id == 2
+    assert (dispatcher.handled, dispatcher.unhandled, dispatcher.failed) == (2, 3, 0)
+
+
+def test_prefixed_topics():
+    """Assert (topic, body) pairs with an environment prefix are handled."""
+    dispatcher = Dispatcher()
+    seen = []
+    dispatcher.register(MeetingNewV1, seen.append)
+    source = [
+        ("org.fedoraproject.prod.fedocal.meeting.new", _body()),
+        ("org.fedoraproject.prod.bodhi.update.comment", {}),
+    ]
+    _run(dispatcher.run(source))
+    assert [type(msg) for msg in seen] == [MeetingNewV1]
+    assert seen[0].topic == "org.fedoraproject.prod.fedocal.meeting.new"
+    assert (dispatcher.handled, dispatcher.unhandled) == (1, 1)
+
+
+def test_async_source():
+    """Assert messages can come from an asynchronous iterable."""
+    dispatcher = Dispatcher()
+    seen = []
+    dispatcher.register(MeetingNewV1, seen.append)
+
+    async def source():
+        for meeting_id in range(3):
+            await asyncio.sleep(0)
+            yield MeetingNewV1(body=_body(meeting_id=meeting_id))
+
+    _run(dispatcher.run(source()))
+    assert [msg.meeting.meeting_id for msg in seen] == [0, 1, 2]
+
+
+def test_failures():
+    """Assert failing handlers are counted and do not stop the messages after."""
+    dispatcher = Dispatcher()
+    seen = []
+
+    @dispatcher.register(MeetingNewV1)
+    def fail(msg):
+        if msg.meeting.meeting_id == 1:
+            raise ValueError("nope")
+        seen.append(msg.meeting.meeting_id)
+
+    source = [MeetingNewV1(body=_body(meeting_id=i)) for i in range(3)]
+    _run(dispatcher.run(source))
+    assert seen == [0, 2]
+    assert (dispatcher.handled, dispatcher.failed) == (2, 1)
+
+
+def test_ordering_and_concurrency():
+    """Assert messages are ordered per key and handled concurrently up to the limit."""
+    dispatcher = Dispatcher(concurrency=4)
+    running = [0, 0]
+    seen = {}
+
+    @dispatcher.register(FedocalMessage)
+    async def handle(msg):
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0.001 * (msg.meeting.meeting_id % 3))
+        seen.setdefault(msg.calendar.calendar_name, []).append(msg.meeting.meeting_id)
+        running[0] -= 1
+
+    calendars = ["infra", "design", "qa"]
+    source = [
+        (MeetingNewV1 if i % 2 else MeetingUpdateV1)(
+            body=_body(calendars[i % 3], meeting_id=i)
+        )
+        for i in range(60)
+    ]
+    _run(dispatcher.run(source))
+    for index, calendar in enumerate(calendars):
+        assert seen[calendar] == list(range(index, 60, 3))
+    assert running[1] == 3
+    assert dispatcher._queues == {}
+
+
+async def _settle():
+    """Let the scheduled tasks run until they wait for something."""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_busy_key_does_not_block_others():
+    """Assert messages waiting for their key do not take the slots of other keys."""
+    dispatcher = Dispatcher(concurrency=4)
+    started = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        @dispatcher.register(MeetingNewV1)
+        async def handle(msg):
+            started.append(msg.calendar.calendar_name)
+            await release.wait()
+
+        for meeting_id in range(10):
+            await dispatcher.dispatch(MeetingNewV1(body=_body("A", meeting_id)))
+        await dispatcher.dispatch(MeetingNewV1(body=_body("B")))
+        await _settle()
+        assert started == ["A", "B"]
+        release.set()
+        await dispatcher.join()
+
+    _run(scenario())
+    assert started == ["A", "B"] + ["A"] * 9
+    assert dispatcher.handled == 11
+
+
+def test_unordered():
+    """Assert messages are handled concurrently, up to the limit, without a key."""
+    dispatcher = Dispatcher(concurrency=10, key=None)
+    running = [0, 0]
+
+    async def scenario():
+        release = asyncio.Event()
+
+        @dispatcher.register(MeetingNewV1)
+        async def handle(msg):
+            running[0] += 1
+            running[1] = max(running)
+            await release.wait()
+            running[0] -= 1
+
+        for _ in range(20):
+            await dispatcher.dispatch(MeetingNewV1(body=_body()))
+        await _settle()
+        assert running == [10, 10]
+        release.set()
+        await dispatcher.join()
+
+    _run(scenario())
+    assert running == [0, 10]
+    assert dispatcher.handled == 20
+
+
+def test_max_pending():
+    """Assert dispatching waits while too many messages are not handled yet."""
+    dispatcher = Dispatcher(concurrency=10, max_pending=2)
+
+    async def scenario():
+        release = asyncio.Event()
+        dispatcher.register(MeetingNewV1, lambda msg: release.wait())
+        await dispatcher.dispatch(MeetingNewV1(body=_body("A")))
+        await dispatcher.dispatch(MeetingNewV1(body=_body("B")))
+        third = asyncio.ensure_future(
+            dispatcher.dispatch(MeetingNewV1(body=_body("C")))
+        )
+        await _settle()
+        assert not third.done()
+        release.set()
+        await third
+        await dispatcher.join()
+
+    _run(scenario())
+    assert dispatcher.handled == 3
+
+
+def test_many():
+    """Assert a large in-memory stream is handled in order per calendar."""
+    dispatcher = Dispatcher(concurrency=50)
+    running = [0, 0]
+    seen = {}
+
+    @dispatcher.register(FedocalMessage)
+    async def handle(msg):
+        running[0] += 1
+        running[1] = max(running)
+        await asyncio.sleep(0)
+        seen.setdefault(msg.calendar.calendar_name, []).append(msg.meeting.meeting_id)
+        running[0] -= 1
+
+    props = MeetingNewV1()._properties
+    count = 20000
+    source = [
+        MeetingNewV1(body=_body("cal%d" % (i % 100), meeting_id=i), properties=props)
+        for i in range(count)
+    ]
+    _run(dispatcher.run(source))
+    assert dispatcher.handled == count
+    for index in range(100):
+        assert seen["cal%d" % index] == list(range(index, count, 100))
+    assert running == [0, 50]
+    assert dispatcher._queues == {}
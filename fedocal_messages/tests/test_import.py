@@ -0,0 +1,75 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the cost of importing the package."""
+
+import subprocess
+import sys
+
+import fedocal_messages
+
+import pytest
+
+
+def _imported_modules(statement):
+    """Return the modules imported by a statement in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def test_import_package():
+    """Assert importing the package does not import its dependencies."""
+    modules = _imported_modules("import fedocal_messages")
+    assert "fedocal_messages" in modules
+    for heavy in ("fedora_messaging", "jsonschema", "pkg_resources", "dateutil"):
+        assert heavy not in modules
+
+
+def test_import_messages():
+    """Assert importing the messages defers what is only needed later."""
+    modules = _imported_modules("import fedocal_messages.messages")
+    assert "fedocal_messages.messages" in modules
+    for deferred in (
+        "dateutil.relativedelta",
+        "dateutil.tz",
+        "concurrent.futures.process",
+        "fedocal_messages.registry",
+    ):
+        assert deferred not in modules
+
+
+def test_lazy_attributes():
+    """Assert the public names are imported when first used."""
+    assert "ReminderV1" in dir(fedocal_messages)
+    from fedocal_messages.messages import ReminderV1
+
+    assert fedocal_messages.ReminderV1 is ReminderV1
+    assert fedocal_messages.__dict__["ReminderV1"] is ReminderV1
+
+
+def test_unknown_attribute():
+    """Assert unknown names still raise AttributeError."""
+    with pytest.raises(AttributeError):
+        fedocal_messages.NotAMessageV1
@@ -0,0 +1,124 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the meeting index."""
+
+import datetime
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..index import MeetingIndex
+from ..messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+)
+
+
+def _message(cls, meeting_id=None, calendar="infra", date="2013-09-20", **fields):
+    body = {"agent": "dummy", "calendar": dict(DUMMY_CALENDAR, calendar_name=calendar)}
+    if meeting_id is not None:
+        body["meeting"] = dict(
+            DUMMY_MEETING, meeting_id=meeting_id, meeting_date=date, **fields
+        )
+    return cls(body=body)
+
+
+def _ids(meetings):
+    return sorted(meeting.meeting_id for meeting in meetings)
+
+
+def test_new():
+    """Assert new meetings are indexed by id, calendar and date."""
+    index = MeetingIndex()
+    assert index.apply(_message(MeetingNewV1, 1)) is True
+    assert index.apply(_message(MeetingNewV1, 2, "design", "2013-09-21")) is True
+    assert len(index) == 2
+    assert 1 in index
+    assert index.get(1).meeting_name == "wat"
+    assert index.get(3) is None
+    assert _ids(index) == [1, 2]
+    assert _ids(index.by_calendar("infra")) == [1]
+    assert _ids(index.by_date(datetime.date(2013, 9, 21))) == [2]
+    assert index.by_calendar("nope") == []
+    assert sorted(index.calendars()) == ["design", "infra"]
+
+
+def test_update():
+    """Assert updates replace meetings and move them between indexes."""
+    index = MeetingIndex()
+    index.apply(_message(MeetingNewV1, 1))
+    index.apply(_message(MeetingUpdateV1, 1, "design", "2013-09-22", meeting_name="x"))
+    assert len(index) == 1
+    assert index.get(1).meeting_name == "x"
+    assert index.by_calendar("infra") == []
+    assert _ids(index.by_calendar("design")) == [1]
+    assert index.by_date(datetime.date(2013, 9, 20)) == []
+    assert _ids(index.by_date(datetime.date(2013, 9, 22))) == [1]
+    assert index.calendars() == ["design"]
+
+
+def test_update_unknown():
+    """Assert updates of meetings missed by the index add them."""
+    index = MeetingIndex()
+    index.apply(_message(MeetingUpdateV1, 1))
+    assert _ids(index) == [1]
+
+
+def test_delete():
+    """Assert deleted meetings are removed from every index."""
+    index = MeetingIndex()
+    index.apply(_message(MeetingNewV1, 1))
+    index.apply(_message(MeetingNewV1, 2))
+    assert index.apply(_message(MeetingDeleteV1, 1)) is True
+    assert index.apply(_message(MeetingDeleteV1, 1)) is False
+    assert _ids(index) == [2]
+    assert _ids(index.by_calendar("infra")) == [2]
+    assert _ids(index.by_date(datetime.date(2013, 9, 20))) == [2]
+
+
+def test_calendar_cascade():
+    """Assert clearing or deleting a calendar removes all its meetings."""
+    index = MeetingIndex()
+    index.apply_many(_message(MeetingNewV1, i, "infra") for i in range(5))
+    index.apply_many(_message(MeetingNewV1, i, "design") for i in range(5, 8))
+    assert index.apply(_message(CalendarClearV1, calendar="infra")) is True
+    assert _ids(index) == [5, 6, 7]
+    assert _ids(index.by_date(datetime.date(2013, 9, 20))) == [5, 6, 7]
+    assert index.apply(_message(CalendarDeleteV1, calendar="design")) is True
+    assert len(index) == 0
+    assert index.by_date(datetime.date(2013, 9, 20)) == []
+    assert index.apply(_message(CalendarDeleteV1, calendar="design")) is False
+
+
+def test_invalid_start():
+    """Assert meetings with an invalid start are not indexed by date."""
+    index = MeetingIndex()
+    index.apply(_message(MeetingNewV1, 1, date="someday"))
+    index.apply(_message(MeetingNewV1, 2, date=None))
+    assert _ids(index.by_calendar("infra")) == [1, 2]
+    assert index.apply(_message(MeetingDeleteV1, 1)) is True
+    assert index.apply(_message(CalendarClearV1, calendar="infra")) is True
+    assert len(index) == 0
+
+
+def test_other_messages():
+    """Assert other messages are ignored."""
+    index = MeetingIndex()
+    assert index.apply_many([_message(CalendarNewV1), _message(MeetingNewV1, 1)]) == 1
+    assert _ids(index) == [1]
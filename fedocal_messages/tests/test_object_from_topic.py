@@ -16,7 +16,27 @@
 
 """Unit tests for common properties of the message schemas."""
 
-from .. import get_message_object_from_topic
+from unittest import mock
+
+from fedora_messaging import message
+
+from .. import (
+    find_class,
+    get_message_object_from_topic,
+    get_message_objects_from_topics,
+    get_registry,
+    refresh_registry,
+)
+from ..messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+)
+from ..registry import _build_registry
 
 
 def test_object_type():
@@ -40,3 +60,113 @@ def test_invalidtopic():
 
     assert str(type(cls())) == "<class 'fedora_messaging.message.Message'>"
     assert hasattr(cls(), "app_name") is False
+
+
+def test_registry_is_cached():
+    """Assert the entry points are only walked once."""
+    refresh_registry()
+    with mock.patch(
+        "fedocal_messages.registry._build_registry", wraps=_build_registry
+    ) as build:
+        get_message_object_from_topic("fedocal.calendar.new")
+        get_message_object_from_topic("fedocal.meeting.new")
+    assert build.call_count == 1
+    assert get_registry()["fedocal.meeting.new"] is MeetingNewV1
+
+
+def test_refresh_registry():
+    """Assert refreshing the registry rebuilds it on the next lookup."""
+    get_registry()
+    refresh_registry()
+    with mock.patch(
+        "fedocal_messages.registry._build_registry", return_value={}
+    ) as build:
+        cls = get_message_object_from_topic("fedocal.calendar.new")
+    assert build.call_count == 1
+    assert cls is message.Message
+    refresh_registry()
+    assert get_message_object_from_topic("fedocal.calendar.new") is CalendarNewV1
+
+
+def test_find_class():
+    """Assert classes are found from topics, with or without a prefix."""
+    assert find_class("fedocal.meeting.new") is MeetingNewV1
+    assert find_class("org.fedoraproject.prod.fedocal.meeting.new") is MeetingNewV1
+    assert find_class("org.fedoraproject.stg.fedocal.calendar.clear") is (
+        CalendarClearV1
+    )
+    assert find_class("") is message.Message
+    assert find_class("fedocal.meeting") is None
+    assert find_class("org.fedoraproject.prod.fedocal.meeting.new.extra") is None
+    assert find_class("org.fedoraproject.prodfedocal.meeting.new") is None
+    assert find_class("org.fedoraproject.prod.") is None
+
+
+def test_find_class_refreshed():
+    """Assert the classes found are forgotten with the registry."""
+    registry = {"bodhi.update.comment": message.Message}
+    refresh_registry()
+    with mock.patch("fedocal_messages.registry._build_registry", return_value=registry):
+        assert find_class("org.fedoraproject.prod.fedocal.meeting.new") is None
+        assert find_class("org.fedoraproject.prod.bodhi.update.comment") is None
+    refresh_registry()
+    assert find_class("org.fedoraproject.prod.fedocal.meeting.new") is MeetingNewV1
+
+
+def test_topics_exact():
+    """Assert plain topics are resolved, skipping unknown ones."""
+    classes = get_message_objects_from_topics(
+        ["fedocal.meeting.new", "fedocal.invalid.topic", "fedocal.meeting.new"]
+    )
+    assert classes == [MeetingNewV1]
+
+
+def test_topics_star():
+    """Assert "*" matches exactly one word."""
+    classes = get_message_objects_from_topics(["fedocal.meeting.*"])
+    assert set(classes) == {
+        MeetingDeleteV1,
+        MeetingNewV1,
+        MeetingUpdateV1,
+        ReminderV1,
+    }
+    assert get_message_objects_from_topics(["fedocal.*"]) == []
+    assert get_message_objects_from_topics(["*.meeting.new"]) == [MeetingNewV1]
+    assert get_message_objects_from_topics(["fedocal.meeting.new.*"]) == []
+
+
+def test_topics_hash():
+    """Assert "#" matches zero or more words."""
+    assert len(get_message_objects_from_topics(["fedocal.#"])) == 9
+    assert len(get_message_objects_from_topics(["#"])) == 9
+    assert get_message_objects_from_topics(["#.clear"]) == [CalendarClearV1]
+    assert get_message_objects_from_topics(["fedocal.calendar.new.#"]) == [
+        CalendarNewV1
+    ]
+    assert set(get_message_objects_from_topics(["fedocal.#.#.delete"])) == {
+        CalendarDeleteV1,
+        MeetingDeleteV1,
+    }
+    assert get_message_objects_from_topics(["bodhi.#"]) == []
+
+
+def test_topics_other_packages():
+    """Assert only fedocal classes are returned."""
+    registry = {
+        "bodhi.update.comment": message.Message,
+        "fedocal.meeting.new": MeetingNewV1,
+    }
+    refresh_registry()
+    with mock.patch("fedocal_messages.registry._build_registry", return_value=registry):
+        assert get_message_objects_from_topics(["#"]) == [MeetingNewV1]
+        assert get_message_objects_from_topics(["bodhi.update.comment"]) == []
+    refresh_registry()
+
+
+def test_topics_mixed():
+    """Assert patterns and topics can be resolved together."""
+    classes = get_message_objects_from_topics(
+        ["fedocal.calendar.new", "fedocal.calendar.*"]
+    )
+    assert classes[0] is CalendarNewV1
+    assert len(classes) == 5
@@ -17,13 +17,22 @@
 """Unit tests for the message schema."""
 
 import datetime
+import random
+from unittest import mock
+
+import dateutil.relativedelta
 
 from jsonschema import ValidationError
 
 import pytest
 
 from .utils import DUMMY_CALENDAR, DUMMY_MEETING
-from ..messages import ReminderV1
+from ..messages import (
+    ReminderV1,
+    _casual_timedelta_string,
+    _relative_parts,
+    casual_timedelta_strings,
+)
 
 
 def test_minimal():
@@ -157,3 +166,85 @@ def test_summary():
     )
     message = ReminderV1(body=body)
     assert expected_summary == message.summary
+
+
+def test_render_reference_time():
+    """Assert the reminder is rendered relative to the given time."""
+    body = {
+        "meeting": DUMMY_MEETING,
+        "calendar": DUMMY_CALENDAR,
+    }
+    message = ReminderV1(body=body)
+    now = datetime.datetime(2013, 9, 20, 9, 30)
+    expected_str = (
+        "Friendly reminder!  The 'wat' meeting from the "
+        "'test_calendar' calendar starts in 2 hours"
+    )
+    assert message.render(now) == expected_str
+    assert message.render(datetime.datetime(2013, 9, 20, 11, 30)).endswith(
+        "starts in 30 minutes"
+    )
+
+
+def test_render_cached():
+    """Assert the text is only rendered once for a reference time."""
+    body = {
+        "meeting": DUMMY_MEETING,
+        "calendar": DUMMY_CALENDAR,
+    }
+    message = ReminderV1(body=body)
+    now = datetime.datetime(2013, 9, 20, 9, 30)
+    with mock.patch(
+        "fedocal_messages.messages._casual_timedelta_string", return_value="soon"
+    ) as casual:
+        assert message.render(now) is message.render(now)
+        assert casual.call_count == 1
+        message.render(now + datetime.timedelta(seconds=1))
+        assert casual.call_count == 2
+        message.body = dict(body)
+        message.render(now + datetime.timedelta(seconds=1))
+        assert casual.call_count == 3
+
+
+def test_relative_parts_match_relativedelta():
+    """Assert the relative parts are the ones relativedelta computes."""
+    rng = random.Random(42)
+    now = datetime.datetime(2020, 1, 31, 12, 30, 15, 250000)
+    spans = [60, 3600, 86400, 28 * 86400, 62 * 86400, 800 * 86400]
+    for _ in range(2000):
+        span = rng.choice(spans)
+        meeting_dt = now + datetime.timedelta(seconds=rng.randint(-span, span))
+        meeting_dt = meeting_dt.replace(microsecond=0)
+        expected = dateutil.relativedelta.relativedelta(meeting_dt, now)
+        assert _relative_parts(meeting_dt, now) == (
+            expected.years,
+            expected.months,
+            expected.days,
+            expected.hours,
+            expected.minutes,
+        ), meeting_dt
+
+
+def test_casual_timedelta_strings():
+    """Assert the batch strings are the ones of each meeting."""
+    now = datetime.datetime(2013, 9, 20, 9, 30, 12)
+    meetings = []
+    for hours in [0, 1, 2, 2, 30, 24 * 40, 24 * 400, -5]:
+        start = datetime.datetime(2013, 9, 20, 9, 30) + datetime.timedelta(hours=hours)
+        meeting = DUMMY_MEETING.copy()
+        meeting["meeting_date"] = start.strftime("%Y-%m-%d")
+        meeting["meeting_time_start"] = start.strftime("%H:%M:%S")
+        meetings.append(meeting)
+    expected = [_casual_timedelta_string(meeting, now) for meeting in meetings]
+    assert casual_timedelta_strings(meetings, now) == expected
+    assert expected[:3] == ["right now", "in 59 minutes", "in 1 hour"]
+    assert expected[-3:] == ["in 1 month", "in 1 year", "in -5 hours"]
+
+
+def test_casual_timedelta_strings_default_now():
+    """Assert the batch strings default to the current time."""
+    now = datetime.datetime.utcnow()
+    meeting = DUMMY_MEETING.copy()
+    meeting["meeting_date"] = now.strftime("%Y-%m-%d")
+    meeting["meeting_time_start"] = now.strftime("%H:%M:%S")
+    assert casual_timedelta_strings([meeting]) == ["right now"]
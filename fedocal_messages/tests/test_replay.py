@@ -0,0 +1,190 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the replay harness."""
+
+import json
+import tracemalloc
+
+from fedora_messaging import message
+from fedora_messaging.exceptions import ValidationError
+
+import pika
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from .. import validation
+from ..messages import CalendarNewV1, MeetingNewV1
+from ..replay import InMemoryQueue, Replay, main, percentile, receive, render
+from ..synthetic import TrafficGenerator
+
+
+BODY = {"agent": "dummy", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+
+
+def _properties(**headers):
+    return pika.BasicProperties(content_encoding="utf-8", headers=headers)
+
+
+def test_queue():
+    """Assert deliveries are consumed in order, and removed from the queue."""
+    first = MeetingNewV1(body=BODY)
+    second = CalendarNewV1(body={"agent": "dummy", "calendar": DUMMY_CALENDAR})
+    queue = InMemoryQueue()
+    queue.publish(first)
+    queue.publish(second)
+    assert len(queue) == 2
+    copy = InMemoryQueue(queue)
+    deliveries = []
+    queue.consume(lambda *delivery: deliveries.append(delivery))
+    assert len(queue) == 0
+    assert len(copy) == 2
+    assert [delivery[0] for delivery in deliveries] == [first.topic, second.topic]
+    assert deliveries[0][1] is first._properties
+    assert json.loads(deliveries[0][2].decode("utf-8")) == BODY
+
+
+def test_receive():
+    """Assert deliveries are turned into valid messages of their topic class."""
+    msg = MeetingNewV1(body=BODY)
+    received = receive(msg.topic, msg._properties, msg._encoded_body)
+    assert isinstance(received, MeetingNewV1)
+    assert received.body == BODY
+    assert received.id == msg.id
+    assert received.severity == msg.severity
+
+
+def test_receive_defaults():
+    """Assert deliveries without headers or encoding are still received."""
+    properties = pika.BasicProperties()
+    received = receive("org.example", properties, b"{}")
+    assert type(received) is message.Message
+    assert received.severity == message.INFO
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not json", b"\xff", json.dumps({"agent": "dummy"}).encode("utf-8")],
+)
+def test_receive_invalid(body):
+    """Assert undecodable or invalid messages raise a ValidationError."""
+    with pytest.raises(ValidationError):
+        receive("fedocal.meeting.new", _properties(), body)
+
+
+def test_render():
+    """Assert messages are rendered as their summary and their text."""
+    msg = MeetingNewV1(body=BODY)
+    assert render(msg) == (msg.summary, str(msg))
+
+
+def test_percentile():
+    """Assert the nearest-rank percentiles are returned."""
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile(values, 0) == 1
+    assert percentile([3], 0.9) == 3
+    assert percentile([], 0.5) == 0.0
+
+
+def test_run():
+    """Assert the stats of each topic and of all the messages are reported."""
+    messages = list(TrafficGenerator(seed=1).messages(300))
+    report = Replay().run(messages)
+    topics = {msg.topic for msg in messages}
+    assert set(report["topics"]) == topics
+    total = report["total"]
+    assert total["messages"] == 300
+    assert total["failed"] == 0
+    assert sum(stats["messages"] for stats in report["topics"].values()) == 300
+    for stats in list(report["topics"].values()) + [total]:
+        assert stats["throughput"] > 0
+        assert 0 < stats["p50"] <= stats["p90"] <= stats["p99"]
+        assert stats["allocated"] > 0
+        assert stats["retained"] >= 0
+
+
+def test_run_failures():
+    """Assert invalid messages and failing callbacks are counted."""
+    calls = []
+
+    def callback(msg):
+        calls.append(msg)
+        if isinstance(msg, CalendarNewV1):
+            raise ValueError("nope")
+
+    invalid = MeetingNewV1(body={"agent": "dummy"})
+    messages = [MeetingNewV1(body=BODY), invalid, CalendarNewV1(body=BODY)]
+    report = Replay(callback, allocations=False).run(messages)
+    assert report["topics"]["fedocal.meeting.new"]["failed"] == 1
+    assert report["topics"]["fedocal.calendar.new"]["failed"] == 1
+    assert report["total"]["failed"] == 2
+    assert report["total"]["allocated"] == report["total"]["retained"] == 0
+    assert len(calls) == 2
+
+
+def test_run_empty():
+    """Assert replaying nothing reports nothing."""
+    report = Replay().run([])
+    assert report["topics"] == {}
+    assert report["total"]["messages"] == 0
+    assert report["total"]["p99"] == report["total"]["allocated"] == 0.0
+
+
+def test_run_cache(monkeypatch):
+    """Assert the validation cache is only used if asked, and restored after."""
+    monkeypatch.setattr(validation, "cache", validation.ValidationCache(enabled=True))
+    messages = [MeetingNewV1(body=BODY) for _ in range(5)]
+    Replay(allocations=False).run(messages)
+    assert validation.cache.hits == validation.cache.misses == 0
+    assert validation.cache.enabled
+    Replay(cache=True).run(messages)
+    assert validation.cache.hits == 4
+    validation.cache.enabled = False
+    Replay(cache=True, allocations=False).run(messages)
+    assert not validation.cache.enabled
+
+
+def test_run_tracing():
+    """Assert tracing memory allocations is left on if it was on."""
+    tracemalloc.start()
+    try:
+        Replay().run([MeetingNewV1(body=BODY)])
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    Replay().run([MeetingNewV1(body=BODY)])
+    assert not tracemalloc.is_tracing()
+
+
+def test_main(tmp_path, capsys):
+    """Assert synthetic traffic or an archive can be replayed from the command line."""
+    assert main(["-n", "50", "--no-allocations"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:3] == ["topic", "messages", "failed"]
+    assert lines[-1].split()[:3] == ["total", "50", "0"]
+
+    archive = tmp_path / "traffic.json"
+    with open(str(archive), "w") as f:
+        TrafficGenerator(seed=3).write(f, 40)
+    output = tmp_path / "stats.json"
+    assert main(["--archive", str(archive), "--cache", "-o", str(output)]) == 0
+    assert capsys.readouterr().out.splitlines()[-1].split()[:3] == ["total", "40", "0"]
+    stats = json.loads(output.read_text())
+    assert stats["total"]["messages"] == 40
+    assert stats["total"]["allocated"] > 0
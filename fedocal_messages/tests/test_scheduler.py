@@ -0,0 +1,212 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the reminder scheduler."""
+
+import asyncio
+import datetime
+import time
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from ..messages import (
+    CalendarNewV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+)
+from ..scheduler import ReminderScheduler
+
+
+NOW = datetime.datetime(2013, 9, 20, 0, 0)
+HOUR = datetime.timedelta(hours=1)
+
+
+def _message(cls, meeting_id, start, properties=None):
+    meeting = dict(
+        DUMMY_MEETING,
+        meeting_id=meeting_id,
+        meeting_date=start.strftime("%Y-%m-%d"),
+        meeting_time_start=start.strftime("%H:%M:%S"),
+    )
+    return cls(
+        body={"agent": "dummy", "calendar": DUMMY_CALENDAR, "meeting": meeting},
+        properties=properties,
+    )
+
+
+def _ids(reminders):
+    return [reminder.body["meeting"]["meeting_id"] for reminder in reminders]
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_schedule():
+    """Assert reminders are due lead before their meeting, in order."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW + 5 * HOUR))
+    scheduler.push(_message(MeetingNewV1, 2, NOW + 3 * HOUR))
+    assert len(scheduler) == 2
+    assert scheduler.next_due() == NOW + 2 * HOUR
+    assert scheduler.pop_due() == []
+    assert scheduler.pop_due(NOW + 2 * HOUR) != []
+    reminders = scheduler.pop_due(NOW + 10 * HOUR)
+    assert _ids(reminders) == [1]
+    assert isinstance(reminders[0], ReminderV1)
+    reminders[0].validate()
+    assert len(scheduler) == 0
+    assert scheduler.next_due() is None
+
+
+def test_reschedule():
+    """Assert updated meetings are rescheduled and their old reminder dropped."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW + 3 * HOUR))
+    scheduler.push(_message(MeetingUpdateV1, 1, NOW + 5 * HOUR))
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == NOW + 4 * HOUR
+    reminders = scheduler.pop_due(NOW + 10 * HOUR)
+    assert _ids(reminders) == [1]
+    assert reminders[0].body["meeting"]["meeting_time_start"] == "05:00:00"
+
+
+def test_cancel():
+    """Assert deleted meetings get their reminder cancelled."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW + 3 * HOUR))
+    scheduler.push(_message(MeetingDeleteV1, 1, NOW + 3 * HOUR))
+    scheduler.push(_message(MeetingDeleteV1, 2, NOW + 3 * HOUR))
+    assert len(scheduler) == 0
+    assert scheduler.pop_due(NOW + 10 * HOUR) == []
+
+
+def test_not_scheduled():
+    """Assert past meetings, invalid starts and other messages are ignored."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW - HOUR))
+    invalid = _message(MeetingNewV1, 2, NOW + HOUR)
+    invalid.body["meeting"]["meeting_date"] = "someday"
+    scheduler.push(invalid)
+    scheduler.push(CalendarNewV1(body={"agent": "dummy", "calendar": DUMMY_CALENDAR}))
+    assert len(scheduler) == 0
+
+
+def test_compaction():
+    """Assert the heap is rebuilt once most of its entries are stale."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    for i in range(2000):
+        scheduler.push(_message(MeetingNewV1, i, NOW + 2 * HOUR))
+    for i in range(1500):
+        scheduler.push(_message(MeetingDeleteV1, i, NOW + 2 * HOUR))
+    assert len(scheduler) == 500
+    assert len(scheduler._heap) < 2000
+    assert _ids(scheduler.pop_due(NOW + 2 * HOUR)) == list(range(1500, 2000))
+
+
+def test_due_soon():
+    """Assert meetings starting within the lead are due right away."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW + HOUR / 2))
+    assert _ids(scheduler.pop_due()) == [1]
+
+
+def test_many():
+    """Assert many meetings are scheduled, rescheduled and cancelled in order."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    # Sharing the properties makes building the messages much faster.
+    props = MeetingNewV1()._properties
+    count = 100000
+    starts = [NOW + datetime.timedelta(minutes=2 + i % 10000) for i in range(count)]
+    messages = [
+        _message(MeetingNewV1, i, start, props) for i, start in enumerate(starts)
+    ]
+    updates = [
+        _message(MeetingUpdateV1, i, starts[i] + HOUR, props)
+        for i in range(0, count, 2)
+    ]
+    deletes = [
+        _message(MeetingDeleteV1, i, starts[i], props) for i in range(1, count, 4)
+    ]
+    for message in messages + updates + deletes:
+        scheduler.push(message)
+    reminders = scheduler.pop_due(NOW + 400 * HOUR)
+    assert len(reminders) == count - len(deletes)
+    due = [r.meeting.start for r in reminders]
+    assert due == sorted(due)
+    assert len(scheduler._heap) == 0
+
+
+def test_run():
+    """Assert reminders are published when due, including newly pushed ones."""
+    base = time.monotonic()
+
+    def clock():
+        # One second of meeting time lasts a hundredth of a second.
+        return NOW + datetime.timedelta(seconds=(time.monotonic() - base) * 100)
+
+    scheduler = ReminderScheduler(lead=datetime.timedelta(0), clock=clock)
+    published = []
+
+    async def publish(reminder):
+        published.append(reminder)
+        if len(published) == 2:
+            scheduler.stop()
+
+    async def main():
+        task = asyncio.ensure_future(scheduler.run(publish))
+        await asyncio.sleep(0.01)
+        scheduler.push(_message(MeetingNewV1, 1, NOW + datetime.timedelta(seconds=3)))
+        scheduler.push(_message(MeetingNewV1, 2, NOW + datetime.timedelta(seconds=2)))
+        await asyncio.wait_for(task, 5)
+
+    _run(main())
+    assert _ids(published) == [2, 1]
+    assert clock() >= NOW + datetime.timedelta(seconds=3)
+    assert scheduler._wakeup is None
+
+
+def test_run_sync_publish():
+    """Assert plain functions can publish the reminders."""
+    scheduler = ReminderScheduler(lead=HOUR, clock=lambda: NOW)
+    scheduler.push(_message(MeetingNewV1, 1, NOW + HOUR / 2))
+    published = []
+
+    def publish(reminder):
+        published.append(reminder)
+        scheduler.stop()
+
+    _run(asyncio.wait_for(scheduler.run(publish), 5))
+    assert _ids(published) == [1]
+
+
+def test_stop_idle():
+    """Assert an idle scheduler can be stopped."""
+    scheduler = ReminderScheduler()
+    scheduler.stop()
+
+    async def main():
+        task = asyncio.ensure_future(scheduler.run(lambda reminder: None))
+        await asyncio.sleep(0.01)
+        scheduler.stop()
+        await asyncio.wait_for(task, 5)
+
+    _run(main())
@@ -0,0 +1,221 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the calendar-sharded consumer."""
+
+import functools
+import json
+import os
+import queue
+import time
+
+from fedora_messaging import message
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from .. import sharding
+from ..messages import CalendarClearV1, MeetingDeleteV1, MeetingNewV1, MeetingUpdateV1
+from ..sharding import ShardedConsumer, _worker, calendar_name, shard_of
+
+
+def _body(calendar, meeting_id=1):
+    return {
+        "agent": "dummy",
+        "calendar": dict(DUMMY_CALENDAR, calendar_name=calendar),
+        "meeting": dict(DUMMY_MEETING, meeting_id=meeting_id),
+    }
+
+
+def _record(directory, msg):
+    """Append the handled message to a file of the worker process."""
+    if msg.body.get("fail"):
+        raise ValueError("nope")
+    path = os.path.join(directory, str(os.getpid()))
+    with open(path, "a") as f:
+        meeting = msg.body.get("meeting", {}).get("meeting_id", "-")
+        f.write("{} {} {}\n".format(msg.calendar.calendar_name, msg.topic, meeting))
+
+
+def _dump(directory, msg):
+    """Append the id, headers and severity of the message to a file of the worker."""
+    with open(os.path.join(directory, str(os.getpid())), "a") as f:
+        f.write(json.dumps([msg.id, msg._headers, msg.severity]) + "\n")
+
+
+def _die(msg):
+    os._exit(3)
+
+
+def _sleep(msg):
+    time.sleep(0.05)
+
+
+def _read(directory):
+    """Return the handled messages of each calendar, and the files they are in."""
+    handled = {}
+    files = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            for line in f:
+                calendar, topic, meeting = line.split()
+                handled.setdefault(calendar, []).append((topic, meeting))
+                files.setdefault(calendar, set()).add(name)
+    return handled, files
+
+
+def test_calendar_name():
+    """Assert the calendar name is found in bodies, or is empty."""
+    assert calendar_name(_body("infra")) == "infra"
+    assert calendar_name({}) == ""
+    assert calendar_name({"calendar": "infra"}) == ""
+    assert calendar_name({"calendar": {"calendar_name": 1}}) == ""
+
+
+def test_shard_of():
+    """Assert calendars are spread over the shards, always the same way."""
+    shards = {shard_of("calendar%d" % i, 4) for i in range(100)}
+    assert shards == {0, 1, 2, 3}
+    assert shard_of("infra", 4) == shard_of("infra", 4)
+
+
+def test_worker():
+    """Assert workers rebuild and handle messages, and report their stats."""
+    inbox = queue.Queue()
+    results = queue.Queue()
+    handled = []
+
+    def handler(msg):
+        if msg.body.get("fail"):
+            raise ValueError("nope")
+        handled.append(msg)
+
+    sent = MeetingUpdateV1(body=_body("infra"), severity=message.WARNING)
+    inbox.put(
+        [
+            ("fedocal.meeting.new", None, None, _body("infra")),
+            ("org.example", None, None, {}),
+        ]
+    )
+    inbox.put([("fedocal.meeting.new", None, None, {"fail": True})])
+    inbox.put(
+        [
+            (
+                "org.fedoraproject.prod.fedocal.meeting.update",
+                sent._headers,
+                sent.id,
+                sent.body,
+            )
+        ]
+    )
+    inbox.put(None)
+    _worker(2, inbox, results, handler)
+    assert isinstance(handled[0], MeetingNewV1)
+    assert type(handled[1]) is message.Message
+    assert isinstance(handled[2], MeetingUpdateV1)
+    assert handled[2].topic == "org.fedoraproject.prod.fedocal.meeting.update"
+    assert handled[2].id == sent.id
+    assert handled[2]._headers == sent._headers
+    assert handled[2].severity == message.WARNING
+    stats = results.get_nowait()
+    assert (stats["shard"], stats["messages"], stats["failed"]) == (2, 4, 1)
+    assert stats["busy"] >= 0
+
+
+def test_ordering(tmp_path):
+    """Assert each calendar is handled in order, by a single worker."""
+    calendars = ["calendar%d" % i for i in range(20)]
+    messages = []
+    for meeting_id in range(10):
+        for calendar in calendars:
+            messages.append(MeetingNewV1(body=_body(calendar, meeting_id)))
+            messages.append(MeetingUpdateV1(body=_body(calendar, meeting_id)))
+            messages.append(
+                (
+                    "fedocal.meeting.delete",
+                    MeetingDeleteV1(body=_body(calendar, meeting_id)).body,
+                )
+            )
+    for calendar in calendars:
+        messages.append(
+            CalendarClearV1(
+                body={"agent": "dummy", "calendar": _body(calendar)["calendar"]}
+            )
+        )
+    messages.append(("fedocal.meeting.new", {"fail": True}))
+
+    consumer = ShardedConsumer(
+        functools.partial(_record, str(tmp_path)), shards=3, queue_size=2, batch_size=7
+    )
+    stats = consumer.run(messages)
+
+    assert [stat["shard"] for stat in stats] == [0, 1, 2]
+    assert sum(stat["messages"] for stat in stats) == len(messages)
+    assert sum(stat["failed"] for stat in stats) == 1
+    assert all(stat["throughput"] >= 0 for stat in stats)
+    handled, files = _read(str(tmp_path))
+    assert sorted(handled) == sorted(calendars)
+    for calendar in calendars:
+        expected = []
+        for meeting_id in range(10):
+            for topic in ("new", "update", "delete"):
+                expected.append(("fedocal.meeting." + topic, str(meeting_id)))
+        expected.append(("fedocal.calendar.clear", "-"))
+        assert handled[calendar] == expected
+        assert len(files[calendar]) == 1
+    assert len(set.union(*files.values())) == 3
+
+
+def test_headers(tmp_path):
+    """Assert messages keep their id, headers and severity in the workers."""
+    messages = [
+        MeetingNewV1(body=_body("calendar%d" % i), severity=message.WARNING)
+        for i in range(10)
+    ]
+    consumer = ShardedConsumer(functools.partial(_dump, str(tmp_path)), shards=2)
+    consumer.run(messages)
+    handled = []
+    for name in os.listdir(str(tmp_path)):
+        with open(os.path.join(str(tmp_path), name)) as f:
+            handled.extend(json.loads(line) for line in f)
+    expected = [[msg.id, msg._headers, message.WARNING] for msg in messages]
+    assert sorted(handled, key=lambda item: item[0]) == sorted(
+        expected, key=lambda item: item[0]
+    )
+
+
+def test_default_shards():
+    """Assert there is one shard per CPU by default."""
+    assert ShardedConsumer(_sleep).shards == (os.cpu_count() or 1)
+
+
+def test_backpressure(monkeypatch):
+    """Assert sending waits while a busy worker has a full queue."""
+    monkeypatch.setattr(sharding, "_POLL_INTERVAL", 0.01)
+    consumer = ShardedConsumer(_sleep, shards=1, queue_size=1, batch_size=1)
+    start = time.perf_counter()
+    stats = consumer.run([("fedocal.meeting.new", _body("infra"))] * 5)
+    assert time.perf_counter() - start >= 0.2
+    assert stats[0]["messages"] == 5
+
+
+@pytest.mark.parametrize("count", [1, 20])
+def test_dead_worker(monkeypatch, count):
+    """Assert a worker dying is reported, whether its queue is full or not."""
+    monkeypatch.setattr(sharding, "_POLL_INTERVAL", 0.01)
+    consumer = ShardedConsumer(_die, shards=1, queue_size=1, batch_size=1)
+    with pytest.raises(RuntimeError, match="died"):
+        consumer.run([("fedocal.meeting.new", _body("infra"))] * count)
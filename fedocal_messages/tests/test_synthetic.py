@@ -0,0 +1,191 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the synthetic traffic generator."""
+
+import collections
+import json
+
+import pytest
+
+from ..archive import read_archive
+from ..messages import CalendarNewV1, MeetingUpdateV1, ReminderV1
+from ..registry import get_registry
+from ..synthetic import TrafficGenerator, main
+
+
+def _topics(records):
+    return collections.Counter(record["topic"] for record in records)
+
+
+def test_seeded():
+    """Assert the same seed gives the same stream, and another seed another one."""
+    first = list(TrafficGenerator(seed=42).records(1000))
+    assert list(TrafficGenerator(seed=42).records(1000)) == first
+    assert list(TrafficGenerator(seed=43).records(1000)) != first
+
+
+def test_all_types():
+    """Assert the nine fedocal messages are generated."""
+    topics = _topics(TrafficGenerator(seed=1).records(50000))
+    assert set(topics) == {topic for topic in get_registry() if topic}
+
+
+def test_calendars_first():
+    """Assert the calendars are created before anything happens to them."""
+    records = list(TrafficGenerator(calendars=30).records(30))
+    assert _topics(records) == {CalendarNewV1.topic: 30}
+    names = {record["body"]["calendar"]["calendar_name"] for record in records}
+    assert len(names) == 30
+
+
+def test_cardinality():
+    """Assert the number of calendars and of meetings per calendar is kept."""
+    generator = TrafficGenerator(calendars=5, meetings=10, cascade_probability=0)
+    records = list(generator.records(20000))
+    names = {record["body"]["calendar"]["calendar_name"] for record in records}
+    assert len(names) == 5
+    assert all(len(meetings) <= 11 for meetings in generator._meetings.values())
+    assert sum(len(meetings) for meetings in generator._meetings.values()) > 25
+
+
+def test_consistent():
+    """Assert messages are only about meetings that exist."""
+    meetings = set()
+    generator = TrafficGenerator(seed=3, calendars=3, cascade_probability=0.05)
+    for record in generator.records(20000):
+        topic = record["topic"]
+        name = record["body"]["calendar"]["calendar_name"]
+        if topic == "fedocal.calendar.new":
+            assert not any(calendar == name for calendar, _ in meetings)
+        elif topic in ("fedocal.calendar.clear", "fedocal.calendar.delete"):
+            meetings = {meeting for meeting in meetings if meeting[0] != name}
+        elif topic == "fedocal.meeting.new":
+            meetings.add((name, record["body"]["meeting"]["meeting_id"]))
+        elif topic.startswith("fedocal.meeting."):
+            meeting = (name, record["body"]["meeting"]["meeting_id"])
+            assert meeting in meetings
+            if topic == "fedocal.meeting.delete":
+                meetings.remove(meeting)
+
+
+def test_bursts():
+    """Assert meeting updates come in bursts, and only when asked to."""
+
+    def longest_burst(generator):
+        longest = run = 0
+        previous = None
+        for record in generator.records(20000):
+            meeting = record["body"].get("meeting", {}).get("meeting_id")
+            if record["topic"] == MeetingUpdateV1.topic and meeting == previous:
+                run += 1
+            else:
+                run = 1
+            previous = meeting if record["topic"] == MeetingUpdateV1.topic else None
+            longest = max(longest, run)
+        return longest
+
+    assert longest_burst(TrafficGenerator(burst_probability=1, max_burst=8)) >= 4
+    assert longest_burst(TrafficGenerator(burst_probability=0, reminder_density=0)) <= 3
+
+
+def test_cascades():
+    """Assert calendars are cleared and deleted as often as asked."""
+    topics = _topics(TrafficGenerator(cascade_probability=0.1).records(10000))
+    assert 300 < topics["fedocal.calendar.clear"] < 700
+    assert 300 < topics["fedocal.calendar.delete"] < 700
+    topics = _topics(TrafficGenerator(cascade_probability=0).records(10000))
+    assert topics["fedocal.calendar.clear"] == topics["fedocal.calendar.delete"] == 0
+
+
+def test_reminder_density():
+    """Assert the fraction of reminders is about the one asked for."""
+    for density in (0, 0.2, 0.5):
+        topics = _topics(TrafficGenerator(reminder_density=density).records(10000))
+        assert abs(topics[ReminderV1.topic] / 10000 - density) < 0.03
+
+
+def test_messages():
+    """Assert the message objects are valid and match their records."""
+    records = list(TrafficGenerator(seed=5, cascade_probability=0.05).records(2000))
+    messages = list(TrafficGenerator(seed=5, cascade_probability=0.05).messages(2000))
+    for record, msg in zip(records, messages):
+        msg.validate()
+        assert msg.topic == record["topic"]
+        assert msg.id == record["id"]
+        assert msg.body == record["body"]
+        assert msg._headers["sent-at"] == record["headers"]["sent-at"]
+        assert msg.agent == record["body"].get("agent")
+        str(msg)
+
+
+def test_write(tmp_path):
+    """Assert written streams can be read back as archives."""
+    path = tmp_path / "traffic.json"
+    with open(str(path), "w") as f:
+        TrafficGenerator(seed=7).write(f, 1000)
+    records = list(TrafficGenerator(seed=7).records(1000))
+    messages = list(read_archive(str(path)))
+    assert [msg.id for msg in messages] == [record["id"] for record in records]
+    assert [msg.body for msg in messages] == [record["body"] for record in records]
+    sent_at = [record["headers"]["sent-at"] for record in records]
+    assert sent_at == sorted(sent_at)
+
+
+def test_main(tmp_path, capsys):
+    """Assert the command line writes to a file or to the standard output."""
+    path = tmp_path / "traffic.json"
+    assert main(["-n", "10", "-o", str(path), "--seed", "2"]) == 0
+    assert main(["-n", "10", "--seed", "2"]) == 0
+    output = capsys.readouterr().out
+    assert path.read_text() == output
+    assert [json.loads(line)["topic"] for line in output.splitlines()] == [
+        CalendarNewV1.topic
+    ] * 10
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"calendars": 0},
+        {"meetings": 0},
+        {"agents": -1},
+        {"max_burst": 0},
+        {"interval": 0},
+        {"burst_probability": 1.5},
+        {"cascade_probability": -0.1},
+        {"reminder_density": 2},
+    ],
+)
+def test_invalid_settings(settings):
+    """Assert settings the generator cannot honour are refused."""
+    with pytest.raises(ValueError, match=list(settings)[0]):
+        TrafficGenerator(**settings)
+
+
+def test_main_invalid(capsys):
+    """Assert invalid settings are reported on the command line."""
+    with pytest.raises(SystemExit):
+        main(["--meetings", "0"])
+    assert "meetings must be positive" in capsys.readouterr().err
+
+
+def test_single_meeting_no_bursts():
+    """Assert the smallest settings still generate a stream."""
+    generator = TrafficGenerator(calendars=1, meetings=1, agents=1, max_burst=1)
+    topics = _topics(generator.records(2000))
+    assert topics[MeetingUpdateV1.topic] > 0
+    assert len(generator._pending) == 0
@@ -0,0 +1,204 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the time helpers."""
+
+import datetime
+import threading
+
+import dateutil.tz
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from .. import timeutils
+from ..messages import ReminderV1
+
+
+def test_utcnow():
+    """Assert the system clock is used by default."""
+    before = datetime.datetime.utcnow()
+    assert before <= timeutils.utcnow() <= datetime.datetime.utcnow()
+
+
+def test_set_clock():
+    """Assert the clock can be replaced and restored."""
+    now = datetime.datetime(2013, 9, 20, 11, 0)
+    previous = timeutils.set_clock(lambda: now)
+    try:
+        assert timeutils.utcnow() == now
+    finally:
+        assert timeutils.set_clock(previous)() == now
+    assert timeutils.utcnow() != now
+    timeutils.set_clock(None)
+    assert timeutils._clock.get() == datetime.datetime.utcnow
+
+
+def test_set_clock_thread():
+    """Assert replacing the clock in a thread does not affect the others."""
+    now = datetime.datetime(2013, 9, 20, 11, 0)
+    seen = []
+
+    def other():
+        seen.append(timeutils.utcnow())
+        timeutils.set_clock(lambda: now)
+
+    with timeutils.frozen_time() as frozen:
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        assert timeutils.utcnow() is frozen
+    assert seen[0] is not frozen
+    assert timeutils.utcnow() != now
+
+
+def test_frozen_time():
+    """Assert the clock stays at the same time in the block."""
+    with timeutils.frozen_time() as now:
+        assert timeutils.utcnow() is now
+        assert timeutils.utcnow() is now
+    assert timeutils.utcnow() is not now
+
+
+def test_frozen_time_reminder():
+    """Assert reminders rendered in the block share the frozen time."""
+    body = {"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR}
+    messages = [ReminderV1(body=body) for _ in range(3)]
+    with timeutils.frozen_time(datetime.datetime(2013, 9, 20, 10, 0)):
+        texts = [str(message) for message in messages]
+        assert str(messages[0]) is texts[0]
+    assert all(text.endswith("starts in 2 hours") for text in texts)
+
+
+def test_message_clock():
+    """Assert a message can be given its own clock."""
+    body = {"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR}
+    message = ReminderV1(body=body)
+    message.clock = lambda: datetime.datetime(2013, 9, 20, 11, 55)
+    with timeutils.frozen_time(datetime.datetime(2013, 9, 20, 10, 0)):
+        assert str(message).endswith("starts in 5 minutes")
+
+
+def test_class_clock(monkeypatch):
+    """Assert a message class can be given its own clock, as a static method."""
+    clock = staticmethod(lambda: datetime.datetime(2013, 9, 20, 11, 55))
+    monkeypatch.setattr(ReminderV1, "clock", clock)
+    body = {"meeting": DUMMY_MEETING, "calendar": DUMMY_CALENDAR}
+    assert str(ReminderV1(body=body)).endswith("starts in 5 minutes")
+
+
+@pytest.mark.parametrize(
+    "date,time",
+    [
+        ("2013-09-20", "12:00:00"),
+        ("2020-02-29", "23:59:59"),
+        ("0001-01-01", "00:00:00"),
+        ("2013-9-20", "12:00:00"),
+        ("2013-09-20", "1:2:3"),
+    ],
+)
+def test_parse_meeting_datetime(date, time):
+    """Assert meeting datetimes are parsed like strptime does."""
+    expected = datetime.datetime.strptime(date + " " + time, "%Y-%m-%d %H:%M:%S")
+    assert timeutils.parse_meeting_datetime.__wrapped__(date, time) == expected
+    assert timeutils.parse_meeting_datetime(date, time) == expected
+
+
+def test_from_parts():
+    """Assert the fallback for Python 3.6 builds the same datetimes."""
+    assert timeutils._from_parts("2013-09-20", "12:34:56") == datetime.datetime(
+        2013, 9, 20, 12, 34, 56
+    )
+
+
+@pytest.mark.parametrize(
+    "date,time",
+    [
+        ("2013-02-30", "12:00:00"),
+        ("2013-09-20", "24:00:00"),
+        ("2013-09-2x", "12:00:00"),
+        ("2013/09/20", "12:00:00"),
+        ("2013-09-20", ""),
+        (None, "12:00:00"),
+    ],
+)
+def test_parse_meeting_datetime_invalid(date, time):
+    """Assert invalid meeting datetimes are refused."""
+    with pytest.raises(ValueError):
+        timeutils.parse_meeting_datetime(date, time)
+
+
+def test_parse_meeting_datetime_cached():
+    """Assert the meeting datetimes are parsed once."""
+    timeutils.parse_meeting_datetime.cache_clear()
+    first = timeutils.parse_meeting_datetime("2013-09-20", "12:00:00")
+    assert timeutils.parse_meeting_datetime("2013-09-20", "12:00:00") is first
+    assert timeutils.parse_meeting_datetime.cache_info().hits == 1
+
+
+def test_get_timezone():
+    """Assert timezones are looked up once, defaulting to UTC."""
+    timeutils.get_timezone.cache_clear()
+    paris = timeutils.get_timezone("Europe/Paris")
+    assert paris is timeutils.get_timezone("Europe/Paris")
+    assert timeutils.get_timezone.cache_info().hits == 1
+    assert timeutils.get_timezone("Not/A_Zone") is dateutil.tz.UTC
+    assert timeutils.get_timezone("") is dateutil.tz.UTC
+    assert timeutils.get_timezone(None) is dateutil.tz.UTC
+
+
+def test_to_timezone():
+    """Assert UTC datetimes are converted to the timezone, across DST changes."""
+    winter = timeutils.to_timezone(
+        datetime.datetime(2020, 3, 29, 0, 30), "Europe/Paris"
+    )
+    summer = timeutils.to_timezone(
+        datetime.datetime(2020, 3, 29, 1, 30), "Europe/Paris"
+    )
+    assert winter.replace(tzinfo=None) == datetime.datetime(2020, 3, 29, 1, 30)
+    assert summer.replace(tzinfo=None) == datetime.datetime(2020, 3, 29, 3, 30)
+    assert winter.utcoffset() == datetime.timedelta(hours=1)
+    assert summer.utcoffset() == datetime.timedelta(hours=2)
+    utc = timeutils.to_timezone(datetime.datetime(2020, 3, 29, 1, 30), "UTC")
+    assert utc.utcoffset() == datetime.timedelta(0)
+
+
+def test_meeting_local_times():
+    """Assert meetings expose their times in their timezone."""
+    meeting = dict(DUMMY_MEETING, meeting_timezone="America/New_York")
+    message = ReminderV1(body={"meeting": meeting, "calendar": DUMMY_CALENDAR})
+    view = message.meeting
+    assert view.timezone is timeutils.get_timezone("America/New_York")
+    assert view.start_local.replace(tzinfo=None) == datetime.datetime(2013, 9, 20, 8)
+    assert view.end_local.replace(tzinfo=None) == datetime.datetime(2013, 9, 21, 8)
+    # The reminder is still relative to the UTC start.
+    assert message.render(datetime.datetime(2013, 9, 20, 10)).endswith("in 2 hours")
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("2020-03-05T16:00:00+00:00", datetime.datetime(2020, 3, 5, 16)),
+        ("2020-03-05T17:00:00+01:00", datetime.datetime(2020, 3, 5, 16)),
+        ("2020-03-05T16:00:00", datetime.datetime(2020, 3, 5, 16)),
+        ("20200305T160000Z", datetime.datetime(2020, 3, 5, 16)),
+        ("yesterday", None),
+        (None, None),
+    ],
+)
+def test_parse_sent_at(value, expected):
+    """Assert sent-at headers are parsed to naive UTC datetimes."""
+    assert timeutils.parse_sent_at(value) == expected
@@ -0,0 +1,367 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Unit tests for the schema validation helpers."""
+
+import json
+import random
+from unittest import mock
+
+from fedora_messaging import exceptions, message
+
+import jsonschema
+from jsonschema import SchemaError, ValidationError
+
+import pytest
+
+from .utils import DUMMY_CALENDAR, DUMMY_MEETING
+from .. import validate_many, validation
+from ..messages import (
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    CalendarUpdateV1,
+    CalendarUploadV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+)
+
+
+def test_validator_reused():
+    """Assert the schema is checked and compiled only once."""
+    schema = {"type": "object", "required": ["a"]}
+    cls = jsonschema.validators.validator_for(schema)
+    with mock.patch.object(cls, "check_schema", wraps=cls.check_schema) as check_schema:
+        first = validation.get_validator(schema)
+        second = validation.get_validator(schema)
+    assert first is second
+    assert check_schema.call_count == 1
+
+
+def test_validator_recycled_id():
+    """Assert a new schema with a recycled id does not reuse a stale validator."""
+    schema = {"type": "object"}
+    other = {"type": "string"}
+    validation._validators[id(other)] = (schema, validation.get_validator(schema))
+    assert validation.get_validator(other).schema is other
+
+
+def test_invalid_schema():
+    """Assert invalid schemas are reported."""
+    with pytest.raises(SchemaError):
+        validation.validate({}, {"type": "wat"})
+
+
+def test_same_error_as_jsonschema():
+    """Assert the error reported is the one jsonschema.validate reports."""
+    meeting = DUMMY_MEETING.copy()
+    meeting["meeting_id"] = "42"
+    del meeting["meeting_name"]
+    body = {"calendar": DUMMY_CALENDAR, "meeting": meeting}
+    msg = ReminderV1(body=body)
+    with pytest.raises(ValidationError) as expected:
+        message.Message.validate(msg)
+    with pytest.raises(ValidationError) as error:
+        msg.validate()
+    assert str(error.value) == str(expected.value)
+
+
+def test_headers_validated():
+    """Assert the message headers are still validated."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    msg = MeetingNewV1(body=body)
+    msg._headers["fedora_messaging_severity"] = 42
+    with pytest.raises(ValidationError):
+        msg.validate()
+
+
+FUZZ_VALUES = [None, True, 0, 4.2, "", "wat", [], ["wat"], [None], [1], {}, {"a": 1}]
+
+ALL_CLASSES = [
+    CalendarClearV1,
+    CalendarDeleteV1,
+    CalendarNewV1,
+    CalendarUpdateV1,
+    CalendarUploadV1,
+    MeetingDeleteV1,
+    MeetingNewV1,
+    MeetingUpdateV1,
+    ReminderV1,
+]
+
+
+def _mutate(rng, value, depth=0):
+    """Return a copy of value with some random keys dropped or replaced."""
+    if isinstance(value, dict):
+        output = {}
+        for key, item in value.items():
+            roll = rng.random()
+            if roll < 0.05:
+                continue
+            elif roll < 0.1:
+                output[key] = rng.choice(FUZZ_VALUES)
+            else:
+                output[key] = _mutate(rng, item, depth + 1)
+        if rng.random() < 0.05:
+            output["extra"] = rng.choice(FUZZ_VALUES)
+        return output
+    if isinstance(value, list) and rng.random() < 0.2:
+        return value + [rng.choice(FUZZ_VALUES)]
+    return value
+
+
+@pytest.mark.parametrize("cls", ALL_CLASSES)
+def test_fast_checker_conformance(cls):
+    """Assert the fast checker agrees with jsonschema on fuzzed bodies."""
+    rng = random.Random(cls.__name__)
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    checker = validation.get_checker(cls.body_schema)
+    validator = validation.get_validator(cls.body_schema)
+    assert checker is not None
+    results = set()
+    for _ in range(500):
+        fuzzed = _mutate(rng, body)
+        expected = validator.is_valid(fuzzed)
+        assert checker(fuzzed) == expected, fuzzed
+        results.add(expected)
+    for value in FUZZ_VALUES:
+        assert checker(value) == validator.is_valid(value), value
+    # Make sure the fuzzing explored both outcomes.
+    assert results == {True, False}
+
+
+@pytest.mark.parametrize("cls", ALL_CLASSES)
+def test_fast_validation_errors(cls):
+    """Assert the fast path reports the same errors as jsonschema."""
+    rng = random.Random(cls.__name__)
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    for _ in range(100):
+        fuzzed = _mutate(rng, body)
+        msg = cls(body=fuzzed)
+        try:
+            msg.validate()
+        except ValidationError as e:
+            expected = str(e)
+        else:
+            expected = None
+        msg.fast_validation = True
+        try:
+            msg.validate()
+        except ValidationError as e:
+            assert str(e) == expected
+        else:
+            assert expected is None
+
+
+def test_fast_checker_unsupported():
+    """Assert no fast checker is built for schemas it does not understand."""
+    assert validation.get_checker({"type": "object", "minProperties": 1}) is None
+    assert validation.get_checker({"type": "integer"}) is None
+    schema = {"$schema": "http://json-schema.org/draft-04/schema#", "items": [{}]}
+    assert validation.get_checker(schema) is None
+    assert validation.get_checker({"properties": {"a": {"enum": [1]}}}) is None
+
+
+def test_fast_checker_invalid_schema():
+    """Assert invalid schemas are still reported with the fast path."""
+    with pytest.raises(SchemaError):
+        validation.validate({}, {"required": "wat"}, fast=True)
+
+
+def test_fast_checker_untyped():
+    """Assert keywords apply without a type, like in jsonschema."""
+    checker = validation.get_checker({"required": ["a"], "items": {"type": "null"}})
+    assert checker("wat")
+    assert checker([None])
+    assert not checker([1])
+    assert not checker({})
+    assert checker({"a": 1})
+
+
+def test_fast_unsupported_falls_back():
+    """Assert schemas without a fast checker are validated by jsonschema."""
+    schema = {"type": "object", "minProperties": 1}
+    validation.validate({"a": 1}, schema, fast=True)
+    with pytest.raises(ValidationError):
+        validation.validate({}, schema, fast=True)
+
+
+def _bodies():
+    """Return a mix of valid and invalid messages of several classes."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    return [
+        MeetingNewV1(body=body),
+        CalendarNewV1(body={"calendar": DUMMY_CALENDAR}),
+        MeetingNewV1(body={"agent": "dummy_user"}),
+        CalendarNewV1(body=body),
+        ReminderV1(body=body),
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_validate_many(workers):
+    """Assert every message gets its own result, in order."""
+    messages = _bodies()
+    results = validate_many(messages, workers=workers, chunksize=1)
+    assert len(results) == len(messages)
+    assert [result is None for result in results] == [True, False, False, True, True]
+    assert isinstance(results[1], ValidationError)
+    assert "'agent' is a required property" in str(results[1])
+    assert "'calendar' is a required property" in str(results[2])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_validate_many_undecodable(workers):
+    """Assert messages whose payload cannot be decoded get their error as result."""
+    properties = MeetingNewV1()._properties
+    messages = [MeetingNewV1.from_raw(b"{not json", properties=properties)]
+    messages += _bodies()[:2]
+    results = validate_many(messages, workers=workers)
+    assert isinstance(results[0], exceptions.ValidationError)
+    assert results[1] is None
+    assert isinstance(results[2], ValidationError)
+
+
+def test_validate_many_empty():
+    """Assert validating no messages returns no results."""
+    assert validate_many(iter([])) == []
+
+
+@pytest.fixture
+def result_cache():
+    """Provide an empty validation cache, restoring its settings afterwards."""
+    cache = validation.cache
+    enabled, maxsize = cache.enabled, cache.maxsize
+    cache.enabled = True
+    cache.clear()
+    yield cache
+    cache.enabled, cache.maxsize = enabled, maxsize
+    cache.clear()
+
+
+def test_cache_hit(result_cache):
+    """Assert a body is only validated against its schema once."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    MeetingNewV1(body=body).validate()
+    assert (result_cache.hits, result_cache.misses) == (0, 1)
+    reordered = dict(reversed(list(body.items())))
+    with mock.patch("fedocal_messages.validation.validate") as validate:
+        MeetingNewV1(body=reordered).validate()
+    # Only the headers were validated.
+    assert validate.call_count == 2
+    assert (result_cache.hits, result_cache.misses) == (1, 1)
+    assert len(result_cache) == 1
+
+
+def test_cache_per_class(result_cache):
+    """Assert the same body is validated again for another class."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    MeetingNewV1(body=body).validate()
+    MeetingUpdateV1(body=body).validate()
+    assert (result_cache.hits, result_cache.misses) == (0, 2)
+
+
+def test_cache_invalid_not_recorded(result_cache):
+    """Assert invalid bodies are reported every time."""
+    msg = MeetingNewV1(body={"calendar": DUMMY_CALENDAR})
+    for _ in range(2):
+        with pytest.raises(ValidationError):
+            msg.validate()
+    assert len(result_cache) == 0
+    assert result_cache.misses == 2
+
+
+def test_cache_headers_still_validated(result_cache):
+    """Assert a cached body does not skip the headers validation."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    MeetingNewV1(body=body).validate()
+    msg = MeetingNewV1(body=body)
+    msg._headers["fedora_messaging_severity"] = 42
+    with pytest.raises(ValidationError):
+        msg.validate()
+
+
+def test_cache_bounded(result_cache):
+    """Assert the least recently used bodies are evicted."""
+    result_cache.maxsize = 2
+    bodies = [{"agent": name, "calendar": DUMMY_CALENDAR} for name in "abc"]
+    CalendarNewV1(body=bodies[0]).validate()
+    CalendarNewV1(body=bodies[1]).validate()
+    CalendarNewV1(body=bodies[0]).validate()
+    CalendarNewV1(body=bodies[2]).validate()
+    assert len(result_cache) == 2
+    assert result_cache.key(CalendarNewV1, bodies[0]) in result_cache
+    assert result_cache.key(CalendarNewV1, bodies[1]) not in result_cache
+
+
+def test_cache_disabled(result_cache):
+    """Assert the cache can be turned off."""
+    result_cache.enabled = False
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR}
+    CalendarNewV1(body=body).validate()
+    CalendarNewV1(body=body).validate()
+    assert len(result_cache) == 0
+    assert (result_cache.hits, result_cache.misses) == (0, 0)
+
+
+def test_cache_unserializable(result_cache):
+    """Assert bodies that are not JSON are validated without the cache."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "extra": object()}
+    CalendarNewV1(body=body).validate()
+    assert len(result_cache) == 0
+
+
+def test_cache_disabled_by_default():
+    """Assert the cache is opt-in."""
+    assert not validation.ValidationCache().enabled
+    assert not validation.cache.enabled
+
+
+@pytest.mark.parametrize(
+    "meeting",
+    [
+        dict(DUMMY_MEETING, meeting_manager=tuple(DUMMY_MEETING["meeting_manager"])),
+        dict(DUMMY_MEETING, extra={1: "one"}),
+    ],
+)
+def test_cache_exact_types(result_cache, meeting):
+    """Assert bodies that are not plain JSON do not share the key of a valid body."""
+    plain = json.loads(json.dumps(meeting))
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": plain}
+    MeetingNewV1(body=body).validate()
+    assert result_cache.key(MeetingNewV1, dict(body, meeting=meeting)) is None
+
+
+def test_cache_tuple_not_valid(result_cache):
+    """Assert a tuple is still rejected after the equivalent list was cached."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR, "meeting": DUMMY_MEETING}
+    MeetingNewV1(body=body).validate()
+    managers = tuple(DUMMY_MEETING["meeting_manager"])
+    msg = MeetingNewV1(
+        body=dict(body, meeting=dict(DUMMY_MEETING, meeting_manager=managers))
+    )
+    with pytest.raises(ValidationError, match="is not of type 'array'"):
+        msg.validate()
+
+
+def test_cache_recursive(result_cache):
+    """Assert bodies containing themselves are validated without the cache."""
+    body = {"agent": "dummy_user", "calendar": DUMMY_CALENDAR}
+    body["self"] = body
+    CalendarNewV1(body=body).validate()
+    assert len(result_cache) == 0
@@ -0,0 +1,195 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Time helpers used to render fedocal messages."""
+
+import contextlib
+import contextvars
+import datetime
+import functools
+
+
+# The clock of the current context, so that replacing it in a thread or an
+# asyncio task does not affect the others.
+_clock = contextvars.ContextVar(
+    "fedocal_messages_clock", default=datetime.datetime.utcnow
+)
+
+
+def utcnow():
+    """Return the current time, as a naive UTC datetime, from the current clock."""
+    return _clock.get()()
+
+
+def set_clock(clock):
+    """
+    Replace the clock used to render messages in the current context.
+
+    The clock is kept in a :class:`contextvars.ContextVar`: it applies to the
+    current thread or asyncio task, and to the tasks it then creates.
+
+    Args:
+        clock (callable): A function returning the current time as a naive UTC
+            datetime, or ``None`` to use the system clock.
+
+    Returns:
+        callable: The previous clock.
+    """
+    previous = _clock.get()
+    _clock.set(clock or datetime.datetime.utcnow)
+    return previous
+
+
+@contextlib.contextmanager
+def frozen_time(now=None):
+    """
+    Stop the clock of the current context for the duration of the ``with`` block.
+
+    Messages rendered in the block all use the same time, which also lets the
+    rendered text be reused. Other threads are not affected.
+
+    Args:
+        now (datetime.datetime): The naive UTC time to freeze the clock at.
+            Defaults to the current time.
+
+    Yields:
+        datetime.datetime: The frozen time.
+    """
+    if now is None:
+        now = utcnow()
+    token = _clock.set(lambda: now)
+    try:
+        yield now
+    finally:
+        _clock.reset(token)
+
+
+def _from_parts(date, time):
+    """Build the datetime of a date and time known to be laid out like fedocal's."""
+    return datetime.datetime(
+        int(date[:4]),
+        int(date[5:7]),
+        int(date[8:]),
+        int(time[:2]),
+        int(time[3:5]),
+        int(time[6:]),
+    )
+
+
+def _from_isoformat(date, time):
+    """Build the datetime of a date and time known to be laid out like fedocal's."""
+    return datetime.datetime.fromisoformat(date + " " + time)
+
+
+# fromisoformat is faster, but only available from Python 3.7.
+if hasattr(datetime.datetime, "fromisoformat"):
+    _from_layout = _from_isoformat
+else:  # pragma: no cover
+    _from_layout = _from_parts
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_meeting_datetime(date, time):
+    """
+    Parse the date and time of a meeting, like ``"2020-03-05"`` and ``"16:00:00"``.
+
+    The fixed layout fedocal uses is sliced directly, anything else goes through
+    :meth:`datetime.datetime.strptime` with the ``%Y-%m-%d %H:%M:%S`` format. The
+    most recent results are kept, since many meetings share the same start.
+
+    Returns:
+        datetime.datetime: The naive datetime.
+
+    Raises:
+        ValueError: If the date or time are invalid.
+    """
+    if (
+        isinstance(date, str)
+        and isinstance(time, str)
+        and len(date) == 10
+        and len(time) == 8
+        and date[4] == date[7] == "-"
+        and time[2] == time[5] == ":"
+    ):
+        digits = date[:4] + date[5:7] + date[8:] + time[:2] + time[3:5] + time[6:]
+        if digits.isdigit():
+            try:
+                return _from_layout(date, time)
+            except ValueError:
+                pass
+    return datetime.datetime.strptime("%s %s" % (date, time), "%Y-%m-%d %H:%M:%S")
+
+
+@functools.lru_cache(maxsize=256)
+def get_timezone(name):
+    """
+    Return the timezone with the given name, like ``"Europe/Paris"``.
+
+    Unknown or empty names give UTC.
+
+    Returns:
+        datetime.tzinfo: The timezone.
+    """
+    import dateutil.tz
+
+    timezone = dateutil.tz.gettz(name) if name else None
+    return timezone or dateutil.tz.UTC
+
+
+@functools.lru_cache(maxsize=4096)
+def to_timezone(utc_dt, name):
+    """
+    Convert a naive UTC datetime to the timezone with the given name.
+
+    The most recent conversions are kept, since many meetings share the same
+    start and timezone.
+
+    Returns:
+        datetime.datetime: The timezone-aware datetime.
+    """
+    import dateutil.tz
+
+    return utc_dt.replace(tzinfo=dateutil.tz.UTC).astimezone(get_timezone(name))
+
+
+def to_naive_utc(value):
+    """Return an aware or naive UTC datetime as a naive UTC datetime."""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_sent_at(value):
+    """
+    Parse the ``sent-at`` header of a message, like ``"2020-03-05T16:00:00+00:00"``.
+
+    Returns:
+        datetime.datetime: The naive UTC datetime, or ``None`` if the value is not
+            an ISO 8601 datetime.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        sent_at = datetime.datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        # Python < 3.7, or a layout fromisoformat does not know, like "Z".
+        import dateutil.parser
+
+        try:
+            sent_at = dateutil.parser.isoparse(value)
+        except ValueError:
+            return None
+    return to_naive_utc(sent_at)
@@ -0,0 +1,345 @@
+# Copyright (C) 2020  Red Hat, Inc.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Schema validation helpers shared by the fedocal message classes."""
+
+import collections
+import hashlib
+import json
+import numbers
+import threading
+
+from fedora_messaging import exceptions as messaging_exceptions
+
+from jsonschema import exceptions, validators
+
+
+# These map id(schema) to a (schema, value) pair. The schema is kept so that
+# its id cannot be recycled by another dict while the entry exists.
+_validators = {}
+_checkers = {}
+
+# Keywords that do not constrain the instance.
+_ANNOTATIONS = {"$schema", "id", "description", "title"}
+
+
+def _cached(cache, schema, build):
+    """Return the value cached for the schema, building it on first use."""
+    try:
+        cached_schema, value = cache[id(schema)]
+    except KeyError:
+        pass
+    else:
+        if cached_schema is schema:
+            return value
+    value = build(schema)
+    cache[id(schema)] = (schema, value)
+    return value
+
+
+def _build_validator(schema):
+    cls = validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
+
+def get_validator(schema):
+    """
+    Return a validator for the schema, building it on first use.
+
+    The schema itself is checked only once, when its validator is built.
+    """
+    return _cached(_validators, schema, _build_validator)
+
+
+def _is_number(instance):
+    return isinstance(instance, numbers.Number) and not isinstance(instance, bool)
+
+
+def _is_null(instance):
+    return instance is None
+
+
+def _isinstance_of(python_type):
+    def check(instance):
+        return isinstance(instance, python_type)
+
+    return check
+
+
+_TYPE_CHECKS = {
+    "array": _isinstance_of(list),
+    "boolean": _isinstance_of(bool),
+    "null": _is_null,
+    "number": _is_number,
+    "object": _isinstance_of(dict),
+    "string": _isinstance_of(str),
+}
+
+
+class _Unsupported(Exception):
+    """Raised when a schema uses keywords the fast checkers do not handle."""
+
+
+def _compile(schema):
+    """Turn a schema into a function returning whether an instance is valid."""
+    unknown = set(schema) - _ANNOTATIONS - {"type", "properties", "required", "items"}
+    if unknown or not isinstance(schema.get("items", {}), dict):
+        raise _Unsupported(sorted(unknown))
+
+    types = schema.get("type", ())
+    if isinstance(types, str):
+        types = [types]
+    try:
+        type_checks = tuple(_TYPE_CHECKS[name] for name in types)
+    except KeyError as e:
+        raise _Unsupported(e.args)
+    required = tuple(schema.get("required", ()))
+    properties = tuple(
+        (name, _compile(subschema))
+        for name, subschema in schema.get("properties", {}).items()
+    )
+    items = _compile(schema["items"]) if "items" in schema else None
+
+    def check(instance):
+        for type_check in type_checks:
+            if type_check(instance):
+                break
+        else:
+            if type_checks:
+                return False
+        if isinstance(instance, dict):
+            for name in required:
+                if name not in instance:
+                    return False
+            for name, check_property in properties:
+                if name in instance and not check_property(instance[name]):
+                    return False
+        elif items is not None and isinstance(instance, list):
+            for item in instance:
+                if not items(item):
+                    return False
+        return True
+
+    return check
+
+
+def _build_checker(schema):
+    # Let invalid schemas go through jsonschema, which reports them.
+    get_validator(schema)
+    try:
+        return _compile(schema)
+    except _Unsupported:
+        return None
+
+
+def get_checker(schema):
+    """
+    Return a fast checker for the schema, building it on first use.
+
+    The checker is a function returning whether an instance is valid. It only
+    understands the keywords used by the fedocal schemas, so ``None`` is
+    returned for schemas using anything else.
+    """
+    return _cached(_checkers, schema, _build_checker)
+
+
+def validate(instance, schema, fast=False):
+    """
+    Validate the instance against the schema, like :func:`jsonschema.validate`.
+
+    Args:
+        instance: The instance to validate.
+        schema (dict): The JSON schema to validate it with.
+        fast (bool): Whether to try the schema's fast checker first. Valid
+            instances are then accepted without going through jsonschema,
+            invalid ones still are so that the error reported is the same.
+
+    Raises:
+        jsonschema.ValidationError: If the instance is invalid.
+        jsonschema.SchemaError: If the schema is invalid.
+    """
+    if fast:
+        checker = get_checker(schema)
+        if checker is not None and checker(instance):
+            return
+    error = exceptions.best_match(get_validator(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+_JSON_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+def _is_plain_json(value):
+    """
+    Return whether the value only holds the exact types JSON decodes to.
+
+    Other types, like tuples or dicts with int keys, would have the same JSON
+    serialization as a plain value while not validating the same way.
+    """
+    kind = type(value)
+    if kind in _JSON_SCALARS:
+        return True
+    if kind is list:
+        return all(_is_plain_json(item) for item in value)
+    if kind is dict:
+        return all(
+            type(key) is str and _is_plain_json(item) for key, item in value.items()
+        )
+    return False
+
+
+class ValidationCache:
+    """
+    A bounded, least recently used record of the message bodies known to be valid.
+
+    Bodies are identified by their message class and a digest of their canonical
+    JSON serialization, so equal bodies share an entry whatever their key order.
+    Only valid bodies are recorded: invalid ones always go through the schema so
+    that the error is reported. Bodies holding anything but the types JSON decodes
+    to are never recorded.
+
+    Looking a body up costs a serialization and a digest, which only pays off
+    when the same bodies are validated again, so the cache is opt-in.
+
+    Attributes:
+        enabled (bool): Whether the cache is used. Defaults to ``False``.
+        maxsize (int): The maximum number of bodies remembered.
+        hits (int): How many lookups found the body.
+        misses (int): How many lookups did not find the body.
+    """
+
+    def __init__(self, maxsize=4096, enabled=False):
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, cls, body):
+        """
+        Return the cache key of a body for a message class.
+
+        Returns:
+            tuple: The key, or ``None`` if the cache is disabled or the body does
+                not only hold plain JSON types.
+        """
+        if not self.enabled or self.maxsize <= 0:
+            return None
+        try:
+            if not _is_plain_json(body):
+                return None
+        except RecursionError:
+            return None
+        canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+        digest = hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+        return (cls, digest)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, key):
+        """Record the body identified by the key as valid."""
+        with self._lock:
+            self._entries[key] = None
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every body and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+cache = ValidationCache()
+
+
+def _validate_chunk(messages):
+    """Validate the messages, returning the error of each one or ``None``."""
+    results = []
+    for message in messages:
+        try:
+            message.validate()
+        except (exceptions.ValidationError, messaging_exceptions.ValidationError) as e:
+            # The latter is raised by messages whose raw payload cannot be decoded.
+            results.append(e)
+        else:
+            results.append(None)
+    return results
+
+
+def validate_many(messages, workers=1, chunksize=1000):
+    """
+    Validate many messages, without stopping at the first invalid one.
+
+    Messages are grouped by class and split into chunks, so that each chunk
+    only uses the validators of a single class. The chunks are validated in
+    a pool of processes when more than one worker is requested.
+
+    Args:
+        messages (iterable): The messages to validate.
+        workers (int): The number of processes to use. With 1, the messages are
+            validated in the current process. With ``None``, one process per CPU
+            is used.
+        chunksize (int): The maximum number of messages sent to a process at once.
+
+    Returns:
+        list: For each message, in order, the :class:`jsonschema.ValidationError`
+            it raised, the :class:`fedora_messaging.exceptions.ValidationError` if its
+            body could not be decoded, or ``None`` if it is valid.
+    """
+    messages = list(messages)
+    groups = {}
+    for index, message in enumerate(messages):
+        groups.setdefault(type(message), []).append(index)
+    chunks = [
+        indexes[start : start + chunksize]
+        for indexes in groups.values()
+        for start in range(0, len(indexes), chunksize)
+    ]
+    payloads = ([messages[index] for index in chunk] for chunk in chunks)
+
+    results = [None] * len(messages)
+    if workers == 1:
+        outputs = map(_validate_chunk, payloads)
+        _collect(results, chunks, outputs)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = executor.map(_validate_chunk, payloads)
+            _collect(results, chunks, outputs)
+    return results
+
+
+def _collect(results, chunks, outputs):
+    for chunk, output in zip(chunks, outputs):
+        for index, result in zip(chunk, output):
+            results[index] = result